@@ -0,0 +1,57 @@
+import os
+import sys
+from ultralytics import YOLO
+
+def export_engine(model_path):
+    """
+    Exports a YOLO checkpoint to a TensorRT FP16 engine.
+    The engine is saved next to the checkpoint (e.g. yolov8m.pt -> yolov8m.engine)
+    and is picked up automatically by main.py / predict_custom.py.
+    """
+    if not os.path.exists(model_path) and os.path.dirname(model_path):
+        print(f"Skipping {model_path}: not found")
+        return None
+
+    print(f"Exporting {model_path} to TensorRT (FP16)...")
+    model = YOLO(model_path)
+    # dynamic + batch=4 so all 4 roads can go through the engine in one call
+    engine_path = model.export(format="engine", half=True, dynamic=True, batch=4, imgsz=640, workspace=4)
+    print(f"Engine saved to: {engine_path}")
+    return engine_path
+
+def export_int8_onnx(model_path):
+    """
+    Exports a YOLO checkpoint to ONNX and quantizes it to INT8 for CPU inference.
+    The model is saved next to the checkpoint (e.g. best.pt -> best_int8.onnx)
+    and is picked up automatically by predict_custom.py when no GPU is present.
+    """
+    if not os.path.exists(model_path) and os.path.dirname(model_path):
+        print(f"Skipping {model_path}: not found")
+        return None
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print(f"Exporting {model_path} to ONNX (INT8)...")
+    onnx_path = YOLO(model_path).export(format="onnx", opset=13, dynamic=True)
+    int8_path = os.path.splitext(model_path)[0] + "_int8.onnx"
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+    print(f"INT8 model saved to: {int8_path}")
+    return int8_path
+
+def main():
+    # Usage: python export_engine.py [--int8] [model.pt ...]
+    args = sys.argv[1:]
+    int8 = "--int8" in args
+    model_paths = [arg for arg in args if arg != "--int8"] or [
+        "yolov8m.pt",
+        "traffic_analysis/custom_yolov8m/weights/best.pt"
+    ]
+
+    for model_path in model_paths:
+        if int8:
+            export_int8_onnx(model_path)
+        else:
+            export_engine(model_path)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,24 @@
 import cv2
 import json
+import os
 import sys
 import numpy as np
-from ultralytics import YOLO
+import torch
+from concurrent.futures import ThreadPoolExecutor
+from model_registry import get_yolo
 
 class TrafficAnalyzer:
     def __init__(self, model_path='yolov8m.pt'):
-        self.model = YOLO(model_path)
+        # Prefer the TensorRT engine produced by export_engine.py when available
+        engine_path = os.path.splitext(model_path)[0] + '.engine'
+        if model_path.endswith('.pt') and os.path.exists(engine_path):
+            model_path = engine_path
+        self.model = get_yolo(model_path)
+        # FP16 inference on CUDA (tensor cores); CPU stays in FP32
+        self.half = torch.cuda.is_available()
         # COCO classes: 2=car, 3=motorcycle, 5=bus, 7=truck
         self.vehicle_classes = [2, 3, 5, 7] 
+        self.vehicle_classes_arr = np.array(self.vehicle_classes, dtype=np.int32)
 
     def get_density_percentage(self, count):
         # Heuristic: Assuming the visible road segment is "full" with 4 vehicles
@@ -22,38 +32,61 @@ class TrafficAnalyzer:
         Calculates Green Signal Time based on traffic density.
         Logic: Linear scaling from MIN_TIME to MAX_TIME.
         """
+        return int(self.calculate_signal_times(density_percentage))
+
+    def calculate_signal_times(self, density_percentages):
+        """
+        Vectorized calculate_signal_time: takes an array of densities
+        (any number of directions / intersections) and returns int32 seconds.
+        """
         MIN_TIME = 30
         MAX_TIME = 60
         
         # Formula: Scale linearly between 30s and 60s based on density
         # 0% density -> 30s
         # 100% density -> 60s
-        added_time = (density_percentage / 100) * (MAX_TIME - MIN_TIME)
-        return int(MIN_TIME + added_time)
+        densities = np.asarray(density_percentages, dtype=np.float64)
+        added_time = (densities / 100) * (MAX_TIME - MIN_TIME)
+        return (MIN_TIME + added_time).astype(np.int32)
 
-    def analyze_road_image(self, image_path):
+    def preprocess_batch(self, image_paths):
+        """
+        Reads the road images so they can be sent to the model together.
+        Unreadable images are kept as None so the order of roads is preserved.
+        cv2.imread releases the GIL, so the 4 roads are decoded in parallel.
+        """
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            return list(pool.map(cv2.imread, image_paths))
 
+    def analyze_batch(self, images):
+        """
+        Analyzes a batch of images, each representing ONE road, in a single forward pass.
+        Returns a list of (count, density percentage), one per image.
+        """
+        valid_images = [img for img in images if img is not None]
+        results = iter(self.model(valid_images, verbose=False, half=self.half) if valid_images else [])
+
+        analysis = []
+        for img in images:
+            if img is None:
+                analysis.append((0, 0.0))
+                continue
+
+            result = next(results)
+            cls = result.boxes.cls.cpu().numpy().astype(np.int32)
+            vehicle_count = int(np.isin(cls, self.vehicle_classes_arr).sum())
+
+            density = self.get_density_percentage(vehicle_count)
+            analysis.append((vehicle_count, density))
+
+        return analysis
+
+    def analyze_road_image(self, image_path):
         """
         Analyzes a single image representing ONE road.
         Returns count and density percentage.
         """
-        img = cv2.imread(image_path)
-        if img is None:
-            return 0, 0.0
-        
-        # Run inference on the whole image
-        results = self.model(img, verbose=False)
-        result = results[0]
-        
-        vehicle_count = 0
-        
-        for box in result.boxes:
-            cls_id = int(box.cls[0])
-            if cls_id in self.vehicle_classes:
-                vehicle_count += 1
-                
-        density = self.get_density_percentage(vehicle_count)
-        return vehicle_count, density
+        return self.analyze_batch(self.preprocess_batch([image_path]))[0]
 
 def main():
     # Mapping specific images to directions as requested
@@ -75,10 +108,13 @@ def main():
     final_signal_times = {}
     
     print("Processing traffic feeds...")
-    for direction, img_path in road_images.items():
-        count, density = analyzer.analyze_road_image(img_path)
-        signal_time = analyzer.calculate_signal_time(density)
-        
+    # Run all 4 roads through the model in one batch
+    imgs = analyzer.preprocess_batch(road_images.values())
+    analysis = analyzer.analyze_batch(imgs)
+    densities = np.array([density for _, density in analysis])
+    signal_times = analyzer.calculate_signal_times(densities)
+
+    for (direction, img_path), (count, density), signal_time in zip(road_images.items(), analysis, signal_times):
         final_counts[direction] = count
         final_densities[direction] = f"{density:.1f}%"
         final_signal_times[direction] = f"{signal_time}s"
@@ -0,0 +1,11 @@
+import functools
+from ultralytics import YOLO
+
+@functools.lru_cache(maxsize=4)
+def get_yolo(model_path, task=None):
+    """
+    Loads a YOLO model once per process and reuses it.
+    Repeated calls with the same path return the same, already initialized model,
+    so the checkpoint is not re-parsed and GPU memory is not reallocated.
+    """
+    return YOLO(model_path, task=task)
@@ -2,12 +2,27 @@ import cv2
 import json
 import sys
 import os
-from ultralytics import YOLO
+import numpy as np
+import torch
+from model_registry import get_yolo
 
 class CustomTrafficAnalyzer:
     def __init__(self, model_path):
+        # FP16 inference on CUDA (tensor cores); CPU stays in FP32
+        self.half = torch.cuda.is_available()
+        
+        # Prefer the artifacts produced by export_engine.py when available:
+        # TensorRT engine on GPU, INT8 ONNX on CPU
+        stem = os.path.splitext(model_path)[0]
+        engine_path = stem + '.engine'
+        int8_path = stem + '_int8.onnx'
+        if model_path.endswith('.pt'):
+            if self.half and os.path.exists(engine_path):
+                model_path = engine_path
+            elif not self.half and os.path.exists(int8_path):
+                model_path = int8_path
         print(f"Loading custom model from: {model_path}")
-        self.model = YOLO(model_path)
+        self.model = get_yolo(model_path, task='detect')
         # Our custom model maps: 0:car, 1:motorcycle, 2:bus, 3:truck
         self.vehicle_classes = [0, 1, 2, 3] 
         self.class_names = {0: 'car', 1: 'motorcycle', 2: 'bus', 3: 'truck'}
@@ -27,24 +42,21 @@ class CustomTrafficAnalyzer:
             "West": 0
         }
         
-        results = self.model(img, verbose=False)
+        results = self.model(img, verbose=False, half=self.half)
         result = results[0]
         
-        for box in result.boxes:
-            cls_id = int(box.cls[0])
-            if cls_id in self.vehicle_classes:
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                cx = (x1 + x2) / 2
-                
-                # Lane Logic
-                if 0 <= cx < col_width:
-                    counts["North"] += 1
-                elif col_width <= cx < 2 * col_width:
-                    counts["East"] += 1
-                elif 2 * col_width <= cx < 3 * col_width:
-                    counts["South"] += 1
-                elif 3 * col_width <= cx <= width:
-                    counts["West"] += 1
+        # Single GPU->CPU copy: rows are [x1, y1, x2, y2, conf, cls]
+        boxes = result.boxes.data.cpu().numpy()
+        cls = boxes[:, -1].astype(np.int32)
+        cx = (boxes[:, 0] + boxes[:, 2]) * 0.5
+        
+        # Lane Logic: bucket box centers into the 4 vertical lanes
+        mask = np.isin(cls, self.vehicle_classes)
+        lanes = np.clip((cx[mask] / col_width).astype(np.int32), 0, 3)
+        lane_counts = np.bincount(lanes, minlength=4)
+        
+        for direction, count in zip(counts, lane_counts):
+            counts[direction] = int(count)
                     
         return counts
 
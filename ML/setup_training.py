@@ -1,6 +1,7 @@
 import os
 import shutil
-from ultralytics import YOLO
+import numpy as np
+from model_registry import get_yolo
 import cv2
 
 # Hardcoded paths of the new images
@@ -25,6 +26,9 @@ LBL_DIR_VAL = os.path.join(BASE_DIR, "labels", "val")
 # 7: truck -> 3
 CLASS_MAP = {2: 0, 3: 1, 5: 2, 7: 3}
 
+# YOLO label format: class x_center y_center width height (normalized)
+LABEL_FMT = ['%d', '%.6f', '%.6f', '%.6f', '%.6f']
+
 def setup():
     # 1. Clean and Create Directories
     if os.path.exists(BASE_DIR):
@@ -37,11 +41,13 @@ def setup():
 
     # 2. Load Model for Auto-labeling
     print("Loading model for auto-labeling...")
-    model = YOLO("yolov8m.pt")
+    model = get_yolo("yolov8m.pt")
 
-    # 3. Process Images
+    # 3. Copy Images
     # We will use the first 4 for train, and the last 1 for val
     split_idx = 4
+    dest_img_paths = []
+    label_paths = []
     
     for i, img_path in enumerate(SOURCE_IMAGES):
         filename = f"image_{i}.jpg"
@@ -56,27 +62,27 @@ def setup():
             
         # Copy Image
         dest_img_path = os.path.join(dest_img_dir, filename)
-        shutil.copy(img_path, dest_img_path)
-        
-        # Auto-Label
-        results = model(dest_img_path, verbose=False)
-        result = results[0]
+        shutil.copyfile(img_path, dest_img_path)
         
-        label_path = os.path.join(dest_lbl_dir, filename.replace(".jpg", ".txt"))
+        dest_img_paths.append(dest_img_path)
+        label_paths.append(os.path.join(dest_lbl_dir, filename.replace(".jpg", ".txt")))
+
+    # 4. Auto-Label all images in a single batched call
+    results = model(dest_img_paths, verbose=False)
+    
+    for dest_img_path, label_path, result in zip(dest_img_paths, label_paths, results):
+        cls = result.boxes.cls.cpu().numpy().astype(int)
+        xywhn = result.boxes.xywhn.cpu().numpy()
         
-        with open(label_path, "w") as f:
-            for box in result.boxes:
-                cls_id = int(box.cls[0])
-                if cls_id in CLASS_MAP:
-                    # YOLO format: class x_center y_center width height (normalized)
-                    # box.xywhn returns [x, y, w, h] normalized
-                    x, y, w, h = box.xywhn[0].tolist()
-                    new_cls = CLASS_MAP[cls_id]
-                    f.write(f"{new_cls} {x} {y} {w} {h}\n")
+        # Keep vehicle classes only and remap COCO ids to our custom ids
+        mask = np.isin(cls, list(CLASS_MAP))
+        new_cls = np.array([CLASS_MAP[c] for c in cls[mask]], dtype=int)
+        labels = np.column_stack([new_cls, xywhn[mask]])
+        np.savetxt(label_path, labels, fmt=LABEL_FMT)
         
-        print(f"Processed {filename} -> {dest_lbl_dir}")
+        print(f"Processed {os.path.basename(dest_img_path)} -> {os.path.dirname(label_path)}")
 
-    # 4. Create data.yaml
+    # 5. Create data.yaml
     yaml_content = f"""
 path: {BASE_DIR}
 train: images/train
@@ -10,18 +10,43 @@ Uses computer vision to detect toy ambulances based on:
 import cv2
 import numpy as np
 import os
-import glob
-from ultralytics import YOLO
+from model_registry import get_yolo
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:  # numba is optional; fall back to a NumPy lookup table
+    HAS_NUMBA = False
+
+# YOLO label format: class x_center y_center width height (normalized)
+LABEL_FMT = ['%d', '%.6f', '%.6f', '%.6f', '%.6f']
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# HSV color ranges (uint8 to match cv2.inRange)
+# White vehicle body
+LOWER_WHITE = np.array([0, 0, 200], dtype=np.uint8)
+UPPER_WHITE = np.array([180, 30, 255], dtype=np.uint8)
+# Red emergency lights (hue wraps around 0/180)
+LOWER_RED1 = np.array([0, 50, 50], dtype=np.uint8)
+UPPER_RED1 = np.array([10, 255, 255], dtype=np.uint8)
+LOWER_RED2 = np.array([170, 50, 50], dtype=np.uint8)
+UPPER_RED2 = np.array([180, 255, 255], dtype=np.uint8)
+# Blue emergency lights
+LOWER_BLUE = np.array([100, 50, 50], dtype=np.uint8)
+UPPER_BLUE = np.array([130, 255, 255], dtype=np.uint8)
+
+def list_images(img_dir):
+    """List image files in a directory with a single os.scandir pass."""
+    if not os.path.isdir(img_dir):
+        return []
+    with os.scandir(img_dir) as entries:
+        return [e.path for e in entries if e.name.lower().endswith(IMAGE_EXTENSIONS)]
 
 def detect_white_vehicles(image):
     """Detect white vehicles in the image using color thresholding."""
     hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    
-    # White color range in HSV
-    lower_white = np.array([0, 0, 200])
-    upper_white = np.array([180, 30, 255])
-    
-    mask = cv2.inRange(hsv, lower_white, upper_white)
+    mask = cv2.inRange(hsv, LOWER_WHITE, UPPER_WHITE)
     
     # Find contours
     contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -35,6 +60,87 @@ def detect_white_vehicles(image):
     
     return white_regions
 
+# Emergency light color codes
+LIGHT_NONE, LIGHT_RED, LIGHT_BLUE = 0, 1, 2
+
+def build_hsv_lut():
+    """Precompute the red/blue emergency light code for every (H, S, V) value."""
+    hsv = np.ogrid[0:180, 0:256, 0:256]
+    
+    def in_range(lower, upper):
+        return np.logical_and.reduce([(c >= lo) & (c <= hi) for c, lo, hi in zip(hsv, lower, upper)])
+    
+    lut = np.full((180, 256, 256), LIGHT_NONE, dtype=np.uint8)
+    lut[in_range(LOWER_RED1, UPPER_RED1) | in_range(LOWER_RED2, UPPER_RED2)] = LIGHT_RED
+    lut[in_range(LOWER_BLUE, UPPER_BLUE)] = LIGHT_BLUE
+    return lut
+
+if HAS_NUMBA:
+    @njit(parallel=True, cache=True, fastmath=True)
+    def count_rb(hsv_roi):
+        """Count red and blue (emergency light) pixels of an HSV ROI in a single pass."""
+        red = 0
+        blue = 0
+        for i in prange(hsv_roi.shape[0]):
+            for j in range(hsv_roi.shape[1]):
+                h = hsv_roi[i, j, 0]
+                s = hsv_roi[i, j, 1]
+                v = hsv_roi[i, j, 2]
+                # Red and blue ranges share the same saturation/value floor
+                if s >= LOWER_RED1[1] and v >= LOWER_RED1[2]:
+                    if h <= UPPER_RED1[0] or h >= LOWER_RED2[0]:
+                        red += 1
+                    elif LOWER_BLUE[0] <= h <= UPPER_BLUE[0]:
+                        blue += 1
+        return red, blue
+
+    @njit(parallel=True, cache=True)
+    def score_boxes(hsv, rects):
+        """Count red and blue pixels inside each (x, y, w, h) rect of a full HSV image, in parallel over boxes."""
+        counts = np.zeros((rects.shape[0], 2), dtype=np.int64)
+        for k in prange(rects.shape[0]):
+            x, y, w, h = rects[k, 0], rects[k, 1], rects[k, 2], rects[k, 3]
+            red = 0
+            blue = 0
+            for i in range(y, y + h):
+                for j in range(x, x + w):
+                    hue = hsv[i, j, 0]
+                    if hsv[i, j, 1] >= LOWER_RED1[1] and hsv[i, j, 2] >= LOWER_RED1[2]:
+                        if hue <= UPPER_RED1[0] or hue >= LOWER_RED2[0]:
+                            red += 1
+                        elif LOWER_BLUE[0] <= hue <= UPPER_BLUE[0]:
+                            blue += 1
+            counts[k, 0] = red
+            counts[k, 1] = blue
+        return counts
+else:
+    # Without numba, a single LUT lookup replaces the inRange/bitwise_or passes
+    HSV_LUT = build_hsv_lut()
+
+    def score_boxes(hsv, rects):
+        """Count red and blue pixels inside each (x, y, w, h) rect of a full HSV image."""
+        counts = np.zeros((rects.shape[0], 2), dtype=np.int64)
+        for k, (x, y, w, h) in enumerate(rects):
+            roi = hsv[y:y+h, x:x+w]
+            codes = HSV_LUT[roi[..., 0], roi[..., 1], roi[..., 2]]
+            counts[k, 0] = np.count_nonzero(codes == LIGHT_RED)
+            counts[k, 1] = np.count_nonzero(codes == LIGHT_BLUE)
+        return counts
+
+def clip_rects(rects, img_width, img_height):
+    """Clamp (x, y, w, h) rects to the image bounds, as detect_emergency_lights does per box."""
+    x = np.clip(rects[:, 0], 0, img_width - 1)
+    y = np.clip(rects[:, 1], 0, img_height - 1)
+    w = np.clip(np.minimum(rects[:, 2], img_width - x), 0, None)
+    h = np.clip(np.minimum(rects[:, 3], img_height - y), 0, None)
+    return np.column_stack([x, y, w, h]).astype(np.int32)
+
+def has_emergency_lights(red_pixels, blue_pixels, total_pixels):
+    """If significant red or blue pixels, likely has emergency lights."""
+    if total_pixels == 0:
+        return False
+    return (red_pixels / total_pixels > 0.01) or (blue_pixels / total_pixels > 0.01)
+
 def detect_emergency_lights(image, x, y, w, h):
     """Check if a region has red/blue emergency lights."""
     try:
@@ -53,43 +159,33 @@ def detect_emergency_lights(image, x, y, w, h):
         
         hsv_roi = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
         
-        # Red color range
-        lower_red1 = np.array([0, 50, 50])
-        upper_red1 = np.array([10, 255, 255])
-        lower_red2 = np.array([170, 50, 50])
-        upper_red2 = np.array([180, 255, 255])
+        if HAS_NUMBA:
+            # Fused red/blue count, no intermediate masks
+            red_pixels, blue_pixels = count_rb(hsv_roi)
+        else:
+            codes = HSV_LUT[hsv_roi[..., 0], hsv_roi[..., 1], hsv_roi[..., 2]]
+            red_pixels = np.count_nonzero(codes == LIGHT_RED)
+            blue_pixels = np.count_nonzero(codes == LIGHT_BLUE)
         
-        # Blue color range
-        lower_blue = np.array([100, 50, 50])
-        upper_blue = np.array([130, 255, 255])
-        
-        mask_red1 = cv2.inRange(hsv_roi, lower_red1, upper_red1)
-        mask_red2 = cv2.inRange(hsv_roi, lower_red2, upper_red2)
-        mask_red = cv2.bitwise_or(mask_red1, mask_red2)
-        mask_blue = cv2.inRange(hsv_roi, lower_blue, upper_blue)
-        
-        # Check if red or blue pixels exist (emergency lights)
-        red_pixels = np.sum(mask_red > 0)
-        blue_pixels = np.sum(mask_blue > 0)
         total_pixels = roi.shape[0] * roi.shape[1]
         
-        if total_pixels == 0:
-            return False
-        
-        # If significant red or blue pixels, likely has emergency lights
-        return (red_pixels / total_pixels > 0.01) or (blue_pixels / total_pixels > 0.01)
+        return has_emergency_lights(red_pixels, blue_pixels, total_pixels)
     except Exception as e:
         return False
 
-def is_ambulance_candidate(image, x, y, w, h):
-    """Determine if a detected vehicle is likely an ambulance."""
+def is_ambulance_candidate(image, x, y, w, h, has_lights=None):
+    """
+    Determine if a detected vehicle is likely an ambulance.
+    has_lights can be passed in when the light check was already done (see score_boxes).
+    """
     try:
         # Ensure coordinates are valid
         if w <= 0 or h <= 0:
             return False
         
         # Check 1: Has emergency lights (red/blue) - most important
-        has_lights = detect_emergency_lights(image, x, y, w, h)
+        if has_lights is None:
+            has_lights = detect_emergency_lights(image, x, y, w, h)
         
         # Check 2: Aspect ratio (ambulances are typically rectangular)
         aspect_ratio = w / h if h > 0 else 0
@@ -114,6 +210,27 @@ def convert_to_yolo_format(x, y, w, h, img_width, img_height):
     
     return x_center, y_center, width, height
 
+def write_labels(label_path, ambulance_rows, vehicle_rows):
+    """Write detected labels, keeping existing (manually added) labels that were not re-detected."""
+    new_rows = ambulance_rows + vehicle_rows
+    
+    # Rows are compared at the precision they are written with
+    detected = {tuple(round(v, 6) for v in row) for row in new_rows}
+    
+    kept_rows = []
+    if os.path.exists(label_path):
+        with open(label_path, 'r') as f:
+            for line in f:
+                parts = line.strip().split()
+                if len(parts) >= 5:
+                    row = (int(parts[0]), *(float(p) for p in parts[1:5]))
+                    # Keep existing ambulance (1) and vehicle (0) labels if not already detected
+                    if row[0] in (0, 1) and row not in detected:
+                        kept_rows.append(row)
+    
+    labels = np.array(new_rows + kept_rows, dtype=np.float64).reshape(-1, 5)
+    np.savetxt(label_path, labels, fmt=LABEL_FMT)
+
 def auto_label_ambulances():
     """Automatically label ambulances in the dataset."""
     CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -130,162 +247,123 @@ def auto_label_ambulances():
     
     # Load YOLO model to detect vehicles first
     print("Loading YOLO model for vehicle detection...")
-    model = YOLO("yolov8m.pt")
+    model = get_yolo("yolov8m.pt")
     
     total_ambulances = 0
     
     # Process training images
     print("\n📁 Processing training images...")
-    train_images = glob.glob(os.path.join(train_img_dir, "*.*"))
-    train_images = [f for f in train_images if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    train_images = list_images(train_img_dir)
     
-    for img_path in train_images:
+    # Stream results so YOLO inference overlaps with the per-image color checks and label I/O
+    train_results = model(train_images, stream=True, verbose=False, conf=0.25) if train_images else []
+    
+    for img_path, result in zip(train_images, train_results):
         filename = os.path.basename(img_path)
         label_path = os.path.join(train_lbl_dir, os.path.splitext(filename)[0] + ".txt")
         
-        # Read image
+        # Read image (for the color checks)
         img = cv2.imread(img_path)
         if img is None:
             continue
         
         img_height, img_width = img.shape[:2]
         
-        # Read existing labels
-        existing_labels = []
-        if os.path.exists(label_path):
-            with open(label_path, 'r') as f:
-                existing_labels = f.readlines()
-        
-        # Detect vehicles using YOLO
-        results = model(img, verbose=False, conf=0.25)
-        result = results[0]
+        # Convert the whole image to HSV once and count light pixels for every box in one call
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        xyxy = result.boxes.xyxy.cpu().numpy()
+        classes = result.boxes.cls.cpu().numpy().astype(int)
+        rects = np.column_stack([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]]).astype(np.int32)
+        clipped_rects = clip_rects(rects, img_width, img_height)
+        light_counts = score_boxes(hsv, clipped_rects)
         
         # Find potential ambulances
-        ambulance_labels = []
-        vehicle_labels = []
+        ambulance_rows = []
+        vehicle_rows = []
         
-        for box in result.boxes:
-            try:
-                cls_id = int(box.cls[0])
-                # Only check vehicle classes (car, bus, truck)
-                if cls_id in [2, 5, 7]:  # car, bus, truck
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    x, y, w, h = int(x1), int(y1), int(x2 - x1), int(y2 - y1)
-                    
-                    # Ensure valid coordinates
-                    if w > 0 and h > 0 and x >= 0 and y >= 0:
-                        # Check if this vehicle is likely an ambulance
-                        if is_ambulance_candidate(img, x, y, w, h):
-                            # Convert to YOLO format
-                            x_center, y_center, width, height = convert_to_yolo_format(
-                                x, y, w, h, img_width, img_height
-                            )
-                            # Ensure normalized values are valid
-                            if 0 <= x_center <= 1 and 0 <= y_center <= 1 and 0 < width <= 1 and 0 < height <= 1:
-                                ambulance_labels.append(f"1 {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n")
-                                total_ambulances += 1
-                                print(f"  ✅ Found ambulance in {filename}")
-                        else:
-                            # Regular vehicle
-                            x_center, y_center, width, height = convert_to_yolo_format(
-                                x, y, w, h, img_width, img_height
-                            )
-                            if 0 <= x_center <= 1 and 0 <= y_center <= 1 and 0 < width <= 1 and 0 < height <= 1:
-                                vehicle_labels.append(f"0 {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n")
-            except Exception as e:
+        for cls_id, (x, y, w, h), (red, blue), (_, _, roi_w, roi_h) in zip(classes, rects, light_counts, clipped_rects):
+            # Only check vehicle classes (car, bus, truck)
+            if cls_id not in [2, 5, 7]:
                 continue
+            
+            # Ensure valid coordinates
+            if w > 0 and h > 0 and x >= 0 and y >= 0:
+                # Check if this vehicle is likely an ambulance
+                has_lights = has_emergency_lights(red, blue, roi_w * roi_h)
+                x_center, y_center, width, height = convert_to_yolo_format(
+                    x, y, w, h, img_width, img_height
+                )
+                # Ensure normalized values are valid
+                if not (0 <= x_center <= 1 and 0 <= y_center <= 1 and 0 < width <= 1 and 0 < height <= 1):
+                    continue
+                
+                if is_ambulance_candidate(img, x, y, w, h, has_lights=has_lights):
+                    ambulance_rows.append((1, x_center, y_center, width, height))
+                    total_ambulances += 1
+                    print(f"  ✅ Found ambulance in {filename}")
+                else:
+                    # Regular vehicle
+                    vehicle_rows.append((0, x_center, y_center, width, height))
         
-        # Write labels (ambulances + vehicles)
-        all_labels = ambulance_labels + vehicle_labels
-        
-        # Also keep existing labels that might be manually added
-        for line in existing_labels:
-            parts = line.strip().split()
-            if len(parts) >= 5:
-                cls_id = int(parts[0])
-                if cls_id == 1:  # Keep existing ambulance labels
-                    if line not in ambulance_labels:
-                        all_labels.append(line)
-                elif cls_id == 0:  # Keep existing vehicle labels if not already detected
-                    if line not in vehicle_labels:
-                        all_labels.append(line)
-        
-        # Write updated labels
-        with open(label_path, 'w') as f:
-            f.writelines(all_labels)
+        # Write labels (ambulances + vehicles), keeping manually added ones
+        write_labels(label_path, ambulance_rows, vehicle_rows)
     
     # Process validation images
     print("\n📁 Processing validation images...")
-    val_images = glob.glob(os.path.join(val_img_dir, "*.*"))
-    val_images = [f for f in val_images if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    val_images = list_images(val_img_dir)
     
-    for img_path in val_images:
+    # Stream results so YOLO inference overlaps with the per-image color checks and label I/O
+    val_results = model(val_images, stream=True, verbose=False, conf=0.25) if val_images else []
+    
+    for img_path, result in zip(val_images, val_results):
         filename = os.path.basename(img_path)
         label_path = os.path.join(val_lbl_dir, os.path.splitext(filename)[0] + ".txt")
         
-        # Read image
+        # Read image (for the color checks)
         img = cv2.imread(img_path)
         if img is None:
             continue
         
         img_height, img_width = img.shape[:2]
         
-        # Read existing labels
-        existing_labels = []
-        if os.path.exists(label_path):
-            with open(label_path, 'r') as f:
-                existing_labels = f.readlines()
-        
-        # Detect vehicles using YOLO
-        results = model(img, verbose=False, conf=0.25)
-        result = results[0]
+        # Convert the whole image to HSV once and count light pixels for every box in one call
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        xyxy = result.boxes.xyxy.cpu().numpy()
+        classes = result.boxes.cls.cpu().numpy().astype(int)
+        rects = np.column_stack([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]]).astype(np.int32)
+        clipped_rects = clip_rects(rects, img_width, img_height)
+        light_counts = score_boxes(hsv, clipped_rects)
         
         # Find potential ambulances
-        ambulance_labels = []
-        vehicle_labels = []
+        ambulance_rows = []
+        vehicle_rows = []
         
-        for box in result.boxes:
-            try:
-                cls_id = int(box.cls[0])
-                if cls_id in [2, 5, 7]:  # car, bus, truck
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    x, y, w, h = int(x1), int(y1), int(x2 - x1), int(y2 - y1)
-                    
-                    if w > 0 and h > 0 and x >= 0 and y >= 0:
-                        if is_ambulance_candidate(img, x, y, w, h):
-                            x_center, y_center, width, height = convert_to_yolo_format(
-                                x, y, w, h, img_width, img_height
-                            )
-                            if 0 <= x_center <= 1 and 0 <= y_center <= 1 and 0 < width <= 1 and 0 < height <= 1:
-                                ambulance_labels.append(f"1 {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n")
-                                total_ambulances += 1
-                                print(f"  ✅ Found ambulance in {filename}")
-                        else:
-                            x_center, y_center, width, height = convert_to_yolo_format(
-                                x, y, w, h, img_width, img_height
-                            )
-                            if 0 <= x_center <= 1 and 0 <= y_center <= 1 and 0 < width <= 1 and 0 < height <= 1:
-                                vehicle_labels.append(f"0 {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n")
-            except Exception as e:
+        for cls_id, (x, y, w, h), (red, blue), (_, _, roi_w, roi_h) in zip(classes, rects, light_counts, clipped_rects):
+            # Only check vehicle classes (car, bus, truck)
+            if cls_id not in [2, 5, 7]:
                 continue
+            
+            # Ensure valid coordinates
+            if w > 0 and h > 0 and x >= 0 and y >= 0:
+                # Check if this vehicle is likely an ambulance
+                has_lights = has_emergency_lights(red, blue, roi_w * roi_h)
+                x_center, y_center, width, height = convert_to_yolo_format(
+                    x, y, w, h, img_width, img_height
+                )
+                # Ensure normalized values are valid
+                if not (0 <= x_center <= 1 and 0 <= y_center <= 1 and 0 < width <= 1 and 0 < height <= 1):
+                    continue
+                
+                if is_ambulance_candidate(img, x, y, w, h, has_lights=has_lights):
+                    ambulance_rows.append((1, x_center, y_center, width, height))
+                    total_ambulances += 1
+                    print(f"  ✅ Found ambulance in {filename}")
+                else:
+                    # Regular vehicle
+                    vehicle_rows.append((0, x_center, y_center, width, height))
         
         # Write labels
-        all_labels = ambulance_labels + vehicle_labels
-        
-        # Keep existing labels
-        for line in existing_labels:
-            parts = line.strip().split()
-            if len(parts) >= 5:
-                cls_id = int(parts[0])
-                if cls_id == 1:
-                    if line not in ambulance_labels:
-                        all_labels.append(line)
-                elif cls_id == 0:
-                    if line not in vehicle_labels:
-                        all_labels.append(line)
-        
-        with open(label_path, 'w') as f:
-            f.writelines(all_labels)
+        write_labels(label_path, ambulance_rows, vehicle_rows)
     
     print()
     print("=" * 50)
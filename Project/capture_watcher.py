@@ -0,0 +1,114 @@
+"""
+Capture Watcher
+Event-driven notification of new images in the captures folder (watchdog / inotify)
+instead of polling the directory with os.listdir
+"""
+
+import os
+import sys
+import time
+import queue
+import mmap
+import hashlib
+from pathlib import Path
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+# Bytes hashed per file for duplicate detection
+HASH_PREFIX_BYTES = 65536
+
+
+def wait_until_stable(path, interval=0.1, timeout=5.0):
+    """Wait until a file's size stops changing (writer finished). Returns True if it settled."""
+    deadline = time.time() + timeout
+    last_size = -1
+    while time.time() < deadline:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return False
+        if size == last_size and size > 0:
+            return True
+        last_size = size
+        time.sleep(interval)
+    return False
+
+
+def content_hash(path, prefix=HASH_PREFIX_BYTES):
+    """
+    Hash the file size plus the first `prefix` bytes of a file (mmap, no read() copy)
+    to spot duplicates saved under a different name. The size keeps different captures
+    that happen to share a prefix apart.
+    Returns: 16-byte blake2b digest, or None if the file is empty or unreadable
+    """
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            h = hashlib.blake2b(os.fstat(f.fileno()).st_size.to_bytes(8, 'little'), digest_size=16)
+            h.update(mm[:prefix])
+            return h.digest()
+    except (OSError, ValueError):  # ValueError: mmap of an empty file
+        return None
+
+
+class CaptureEventHandler(FileSystemEventHandler):
+    """Push fully written image files onto a queue."""
+
+    def __init__(self, file_queue, extensions=IMAGE_EXTENSIONS):
+        super().__init__()
+        self.file_queue = file_queue
+        self.extensions = extensions
+
+    def _push(self, path):
+        # Never block the observer thread on a bounded queue; a dropped event is logged
+        if path.lower().endswith(self.extensions):
+            try:
+                self.file_queue.put_nowait(path)
+            except queue.Full:
+                print(f"[WATCHER] ⚠ Queue full, dropped: {os.path.basename(path)}")
+
+    def on_closed(self, event):
+        # Linux (inotify IN_CLOSE_WRITE): the writer has closed the file
+        if not event.is_directory:
+            self._push(event.src_path)
+
+    def on_moved(self, event):
+        # File renamed into place (atomic write)
+        if not event.is_directory:
+            self._push(event.dest_path)
+
+    def on_created(self, event):
+        # Other platforms have no close event; wait for the size to settle instead
+        if sys.platform.startswith('linux') or event.is_directory:
+            return
+        if wait_until_stable(event.src_path):
+            self._push(event.src_path)
+
+
+def start_watcher(folder, file_queue, extensions=IMAGE_EXTENSIONS):
+    """
+    Queue images already in folder, then start watching it for new ones.
+    Never blocks: with a bounded file_queue, backlog images that don't fit are skipped.
+    Returns: the running Observer (call stop() and join() to shut it down)
+    """
+    Path(folder).mkdir(exist_ok=True)
+
+    # Images captured before the watcher started (is_file uses the d_type from the
+    # directory listing, so no per-file stat; only the matching paths get sorted)
+    with os.scandir(folder) as entries:
+        paths = sorted(
+            entry.path for entry in entries
+            if entry.is_file(follow_symlinks=False) and entry.name.lower().endswith(extensions)
+        )
+    for i, path in enumerate(paths):
+        try:
+            file_queue.put_nowait(path)
+        except queue.Full:
+            print(f"[WATCHER] ⚠ Queue full, skipped {len(paths) - i} existing images")
+            break
+
+    observer = Observer()
+    observer.schedule(CaptureEventHandler(file_queue, extensions), folder, recursive=False)
+    observer.start()
+    return observer
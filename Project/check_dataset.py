@@ -5,7 +5,13 @@ Checks dataset structure, label files, and class distribution.
 """
 
 import os
-import glob
+
+def count_files(directory, extensions):
+    """Count files with the given extensions using a single os.scandir pass."""
+    if not os.path.exists(directory):
+        return 0
+    with os.scandir(directory) as entries:
+        return sum(1 for e in entries if e.name.lower().endswith(extensions))
 
 def check_dataset():
     CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -22,21 +28,21 @@ def check_dataset():
     val_lbl_dir = os.path.join(DATASET_DIR, "labels", "val")
     
     # Count images
-    train_images = [f for f in os.listdir(train_img_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png'))] if os.path.exists(train_img_dir) else []
-    val_images = [f for f in os.listdir(val_img_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png'))] if os.path.exists(val_img_dir) else []
+    train_images = count_files(train_img_dir, ('.jpg', '.jpeg', '.png'))
+    val_images = count_files(val_img_dir, ('.jpg', '.jpeg', '.png'))
     
     print(f"📊 Dataset Summary:")
-    print(f"   Training images: {len(train_images)}")
-    print(f"   Validation images: {len(val_images)}")
+    print(f"   Training images: {train_images}")
+    print(f"   Validation images: {val_images}")
     print()
     
     # Check labels
-    train_labels = [f for f in os.listdir(train_lbl_dir) if f.endswith('.txt')] if os.path.exists(train_lbl_dir) else []
-    val_labels = [f for f in os.listdir(val_lbl_dir) if f.endswith('.txt')] if os.path.exists(val_lbl_dir) else []
+    train_labels = count_files(train_lbl_dir, ('.txt',))
+    val_labels = count_files(val_lbl_dir, ('.txt',))
     
     print(f"📝 Label Files:")
-    print(f"   Training labels: {len(train_labels)}")
-    print(f"   Validation labels: {len(val_labels)}")
+    print(f"   Training labels: {train_labels}")
+    print(f"   Validation labels: {val_labels}")
     print()
     
     # Check class distribution
@@ -45,17 +51,20 @@ def check_dataset():
         if not os.path.exists(label_dir):
             return class_counts
         
-        for label_file in glob.glob(os.path.join(label_dir, "*.txt")):
-            try:
-                with open(label_file, 'r') as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        if len(parts) >= 5:
-                            cls_id = int(parts[0])
-                            if cls_id in class_counts:
-                                class_counts[cls_id] += 1
-            except Exception as e:
-                print(f"   ⚠️  Error reading {label_file}: {e}")
+        with os.scandir(label_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.txt'):
+                    continue
+                try:
+                    with open(entry.path, 'r') as f:
+                        for line in f:
+                            parts = line.strip().split()
+                            if len(parts) >= 5:
+                                cls_id = int(parts[0])
+                                if cls_id in class_counts:
+                                    class_counts[cls_id] += 1
+                except Exception as e:
+                    print(f"   ⚠️  Error reading {entry.path}: {e}")
         
         return class_counts
     
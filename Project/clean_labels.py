@@ -3,34 +3,33 @@
 
 import os
 import glob
+import numpy as np
 
 def clean_label_file(label_path):
     """Remove duplicate labels from a file."""
-    if not os.path.exists(label_path):
+    if not os.path.exists(label_path) or os.path.getsize(label_path) == 0:
         return
     
     with open(label_path, 'r') as f:
         lines = f.readlines()
     
-    # Keep unique labels (based on class and approximate position)
-    seen = set()
-    cleaned = []
-    
-    for line in lines:
-        parts = line.strip().split()
-        if len(parts) >= 5:
-            cls_id = parts[0]
-            x = float(parts[1])
-            y = float(parts[2])
-            # Round to 3 decimals for comparison
-            key = (cls_id, round(x, 3), round(y, 3))
-            if key not in seen:
-                seen.add(key)
-                cleaned.append(line)
-    
-    # Write cleaned labels
+    # Only well-formed label lines (class x y w h ...) are kept, as written
+    parsed = [(line, line.split()) for line in lines]
+    lines = [line for line, parts in parsed if len(parts) >= 5]
+    parts = [parts for _, parts in parsed if len(parts) >= 5]
+    
+    if lines:
+        # Keep unique labels (based on class and approximate position)
+        # Round to 3 decimals for comparison; class ids compared as written
+        _, cls_codes = np.unique([p[0] for p in parts], return_inverse=True)
+        xy = np.array([(p[1], p[2]) for p in parts], dtype=float)
+        key = np.column_stack([cls_codes, np.round(xy, 3)])
+        _, first_idx = np.unique(key, axis=0, return_index=True)
+        lines = [lines[i] for i in np.sort(first_idx)]
+    
+    # Write cleaned labels (original lines, original order)
     with open(label_path, 'w') as f:
-        f.writelines(cleaned)
+        f.writelines(lines)
 
 def clean_all_labels():
     CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
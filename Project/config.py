@@ -2,13 +2,16 @@
 Configuration for Smart Traffic Management System
 """
 
+import os
+
 # ThingSpeak Configuration
 THINGSPEAK_API_KEY = "YOUR_THINGSPEAK_API_KEY"  # Replace with your API key
 THINGSPEAK_CHANNEL_ID = "YOUR_CHANNEL_ID"  # Replace with your channel ID
 THINGSPEAK_BASE_URL = "https://api.thingspeak.com/update"
 
 # Camera Configuration
-CAMERA_SOURCE = "http://10.52.250.215/capture"  # 0 for webcam, HTTP URL for web server, or ESP32-CAM IP
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE", "http://10.52.250.215/capture")  # 0 for webcam, HTTP URL for web server, or ESP32-CAM IP
+CAMERA_SOURCE = int(CAMERA_SOURCE) if str(CAMERA_SOURCE).isdigit() else CAMERA_SOURCE  # Webcam index from env
 CAPTURE_INTERVAL = 5  # Seconds between captures
 IMAGE_WIDTH = 640
 IMAGE_HEIGHT = 480
@@ -17,6 +20,7 @@ REQUEST_TIMEOUT = 10  # Timeout for HTTP requests in seconds
 # Model Configuration
 MODEL_PATH = "Project/custom_model.pt"  # Your YOLO model
 CONFIDENCE_THRESHOLD = 0.5
+BATCH_SIZE = 4  # Images per YOLO call in the detection loop
 VEHICLE_CLASSES = [0, 1]  # Car (0) and Ambulance (1) only
 
 # Traffic Density Thresholds
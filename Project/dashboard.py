@@ -3,11 +3,20 @@ import streamlit as st
 import time
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 import cv2
 import os
-import importlib
-import traffic_engine
+import functools
+import torch
+from collections import namedtuple
+
+try:
+    import orjson as json_lib
+except ImportError:  # orjson is optional; stdlib json parses the same payload
+    import json as json_lib
 from traffic_engine import TrafficAnalyzer
+from model_registry import cached_export
+from config import IMAGE_WIDTH, IMAGE_HEIGHT
 
 # ==========================================
 # PAGE CONFIGURATION
@@ -24,33 +33,59 @@ st.set_page_config(
 # ==========================================
 @st.cache_resource
 def get_analyzer():
-    # Force reload of the module to pick up changes
-    # Updated to TrafficAnalyzer v2 (returns 4 values)
-    importlib.reload(traffic_engine)
-    from traffic_engine import TrafficAnalyzer
-    
+    # TrafficAnalyzer v2 (returns 4 values)
     custom_model_path = os.path.join(os.path.dirname(__file__), 'custom_model.pt')
     default_model_path = os.path.join(os.path.dirname(__file__), 'yolov8m.pt')
     
-    if os.path.exists(custom_model_path):
-        return TrafficAnalyzer(custom_model_path)
-    return TrafficAnalyzer(default_model_path)
+    model_path = custom_model_path if os.path.exists(custom_model_path) else default_model_path
+    
+    # On CPU, trace to TorchScript once and load the cached file on later starts
+    # (on CUDA the analyzer exports a TensorRT engine from the .pt itself)
+    if not torch.cuda.is_available():
+        try:
+            model_path = cached_export(model_path, 'torchscript', '.torchscript', imgsz=640)
+        except Exception as e:
+            print(f"[DASHBOARD] TorchScript export failed, using {os.path.basename(model_path)}: {e}")
+    analyzer = TrafficAnalyzer(model_path)
+    
+    # Warm up on a blank frame so the first real upload isn't a cold start
+    blank = np.zeros((IMAGE_HEIGHT, IMAGE_WIDTH, 3), dtype=np.uint8)
+    with torch.inference_mode():
+        for _ in range(2):
+            analyzer.analyze_road_image(blank)
+    return analyzer
+
+# ==========================================
+# HTTP SESSION
+# ==========================================
+@st.cache_resource
+def _http_session():
+    # Keep-alive session so ThingSpeak polls reuse the same TLS connection
+    s = requests.Session()
+    s.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return s
 
 # ==========================================
 # CSS LOADING
 # ==========================================
+@st.cache_data
+def _read_css(path, mtime):
+    # mtime is part of the cache key so edits to the stylesheet are picked up
+    with open(path) as f:
+        return f.read()
+
 def load_css(file_name, theme):
     base_dir = os.path.dirname(__file__)
     css_path = os.path.join(base_dir, file_name)
     
-    with open(css_path) as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+    css = _read_css(css_path, os.path.getmtime(css_path))
+    st.markdown(f'<style>{css}</style>', unsafe_allow_html=True)
     
     if theme == "Light Mode":
         try:
             light_css_path = os.path.join(base_dir, "style_light.css")
-            with open(light_css_path) as f:
-                st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+            light_css = _read_css(light_css_path, os.path.getmtime(light_css_path))
+            st.markdown(f'<style>{light_css}</style>', unsafe_allow_html=True)
         except FileNotFoundError:
             pass
 
@@ -67,61 +102,66 @@ if 'run_analysis' not in st.session_state: st.session_state.run_analysis = False
 if 'time_left' not in st.session_state: st.session_state.time_left = 0
 if 'active_lane' not in st.session_state: st.session_state.active_lane = "N"
 if 'is_emg' not in st.session_state: st.session_state.is_emg = False
+# Values of the latest timer tick, read by the metrics bar
+if 'tick_data' not in st.session_state: st.session_state.tick_data = None
+if 'tick_emg' not in st.session_state: st.session_state.tick_emg = False
+
+# Lane order used by all density arrays
+LANES = "NESW"
+
+# One dashboard tick: densities is a float32 array in LANES order
+TrafficSample = namedtuple("TrafficSample", "densities emg aqi latency")
+
+# Sine phase offsets for the simulated N, E, S, W lanes
+LANE_PHASES = np.array([0, 2, 4, 5])
 
 def get_simulated_data():
     t = time.time()
-    return {
-        "N": int(50 + 40 * np.sin(t/5)) + np.random.randint(-5, 5),
-        "E": int(50 + 40 * np.sin(t/5 + 2)) + np.random.randint(-5, 5),
-        "S": int(50 + 40 * np.sin(t/5 + 4)) + np.random.randint(-5, 5),
-        "W": int(50 + 40 * np.sin(t/5 + 5)) + np.random.randint(-5, 5),
-        "Emg": 1 if np.random.random() > 0.98 else 0,
-        "AQI": np.random.randint(20, 150),
-        "Latency": np.random.randint(10, 40)
-    }
+    base = (50 + 40 * np.sin(t/5 + LANE_PHASES)).astype(int)
+    vals = base + np.random.randint(-5, 5, size=4)
+    return TrafficSample(
+        densities=vals.astype(np.float32),
+        emg=1 if np.random.random() > 0.98 else 0,
+        aqi=np.random.randint(20, 150),
+        latency=np.random.randint(10, 40)
+    )
 
 def get_live_data(channel, key):
     try:
         url = f"https://api.thingspeak.com/channels/{channel}/feeds/last.json?api_key={key}"
-        r = requests.get(url).json()
-        return {
-            "N": float(r.get("field1") or 0),
-            "E": float(r.get("field2") or 0),
-            "S": float(r.get("field3") or 0),
-            "W": float(r.get("field4") or 0),
-            "Emg": int(r.get("field5") or 0),
-            "AQI": float(r.get("field7") or 0),
-            "Latency": 120
-        }
+        r = json_lib.loads(_http_session().get(url, timeout=(2, 3)).content)
+        return TrafficSample(
+            densities=np.array([float(r.get(f"field{i}") or 0) for i in range(1, 5)], dtype=np.float32),
+            emg=int(r.get("field5") or 0),
+            aqi=float(r.get("field7") or 0),
+            latency=120
+        )
     except:
         return get_simulated_data()
 
-def logic_engine(data):
+def logic_engine(sample):
     if st.session_state.override:
         return st.session_state.override, 999, False
-    if data["Emg"] == 1:
+    if sample.emg == 1:
         return "N", 99, True
-    d = {k: max(0, min(100, v)) for k,v in data.items() if k in ["N","E","S","W"]}
-    active = max(d, key=d.get)
-    val = d[active]
-    timer = 30 + int((val / 100) * 60)
-    return active, timer, False
+    idx, timer = pick_lane(sample.densities)
+    return LANES[idx], timer, False
+
+def pick_lane(densities):
+    """Pick the busiest lane from a 4-element N/E/S/W density array. Returns (index, green_time)."""
+    d = np.clip(densities, 0, 100)
+    i = int(np.argmax(d))
+    return i, 30 + int((d[i] / 100) * 60)
 
 # ==========================================
 # COMPONENTS (HTML)
 # ==========================================
-def card_html(direction, density, is_active, is_yellow=False):
-    if is_active:
-        state_cls, r, y, g, status_txt, col = "status-go", "", "", "active", "GO", "#00ff9d"
-    elif is_yellow:
-        state_cls, r, y, g, status_txt, col = "status-slow", "", "active", "", "SLOW", "#ffcc00"
-    else:
-        state_cls, r, y, g, status_txt, col = "status-stop", "active", "", "", "STOP", "#ff0055"
-        
-    names = {"N":"NORTH", "E":"EAST", "S":"SOUTH", "W":"WEST"}
-    return f"""<div class="glass-card {state_cls}">
-<div class="card-header">{names[direction]} AVE ({direction})</div>
-<div class="density-value">{int(density)}<span style="font-size:1rem">%</span></div>
+LANE_NAMES = {"N":"NORTH", "E":"EAST", "S":"SOUTH", "W":"WEST"}
+
+# HTML templates, built once and filled with str.format per render
+CARD_TEMPLATE = """<div class="glass-card {state_cls}">
+<div class="card-header">{name} AVE ({direction})</div>
+<div class="density-value">{density}<span style="font-size:1rem">%</span></div>
 <div class="density-label">TRAFFIC DENSITY</div>
 <div class="pole">
 <div class="bulb red {r}"></div>
@@ -133,23 +173,45 @@ def card_html(direction, density, is_active, is_yellow=False):
 </div>
 </div>"""
 
-def timer_html(timer, active_lane, is_emg):
-    names = {"N":"NORTH", "E":"EAST", "S":"SOUTH", "W":"WEST"}
-    lane_txt = "EMERGENCY" if is_emg else f"{names.get(active_lane, active_lane)} OPEN"
-    badge_cls = "emergency" if is_emg else ""
-    return f"""<div class="ring-container">
+TIMER_TEMPLATE = """<div class="ring-container">
 <div class="time-label">TIME REMAINING</div>
 <div class="time-val">{timer}</div>
 <div class="time-label">SECONDS</div>
 <div class="lane-badge {badge_cls}">{lane_txt}</div>
 </div>"""
 
-def metric_html(label, value, color="#00ff9d"):
-    return f"""<div class="metric-box">
+METRIC_TEMPLATE = """<div class="metric-box">
 <div class="metric-val" style="color:{color}">{value}</div>
 <div class="metric-lbl">{label}</div>
 </div>"""
 
+def card_html(direction, density, is_active, is_yellow=False):
+    # Output only depends on the integer density, so renders are memoized on it
+    return _card_html_cached(direction, int(density), bool(is_active), bool(is_yellow))
+
+@functools.lru_cache(maxsize=2048)
+def _card_html_cached(direction, density, is_active, is_yellow):
+    if is_active:
+        state_cls, r, y, g, status_txt, col = "status-go", "", "", "active", "GO", "#00ff9d"
+    elif is_yellow:
+        state_cls, r, y, g, status_txt, col = "status-slow", "", "active", "", "SLOW", "#ffcc00"
+    else:
+        state_cls, r, y, g, status_txt, col = "status-stop", "active", "", "", "STOP", "#ff0055"
+        
+    return CARD_TEMPLATE.format(
+        state_cls=state_cls, name=LANE_NAMES[direction], direction=direction,
+        density=density, r=r, y=y, g=g, col=col, status_txt=status_txt
+    )
+
+def timer_html(timer, active_lane, is_emg):
+    lane_txt = "EMERGENCY" if is_emg else f"{LANE_NAMES.get(active_lane, active_lane)} OPEN"
+    badge_cls = "emergency" if is_emg else ""
+    return TIMER_TEMPLATE.format(timer=timer, badge_cls=badge_cls, lane_txt=lane_txt)
+
+@functools.lru_cache(maxsize=256)
+def metric_html(label, value, color="#00ff9d"):
+    return METRIC_TEMPLATE.format(label=label, value=value, color=color)
+
 # ==========================================
 # LAYOUT EXECUTION
 # ==========================================
@@ -168,80 +230,89 @@ load_css("style.css", theme_choice)
 st.divider()
 
 
-# Wrapper Logic
-if st.session_state.mode == "Simulation":
-    data = get_simulated_data()
-elif st.session_state.mode == "AI Analysis":
-    if st.session_state.ai_data is None:
-        st.session_state.ai_data = get_simulated_data() # Default/Fallback
-    data = st.session_state.ai_data
-else:
-    data = get_simulated_data() # Placeholder for Live Data
-
-# Logic and Timer Management
-target_active, target_time, target_emg = logic_engine(data)
-
-if st.session_state.override:
-    # Override Mode
-    active = st.session_state.override
-    timer = 999
-    is_emg = False
-    st.session_state.active_lane = active # Sync state
-elif target_emg and not st.session_state.is_emg:
-    # Emergency Interrupt
-    st.session_state.active_lane = target_active
-    st.session_state.time_left = target_time
-    st.session_state.is_emg = True
-    active, timer, is_emg = target_active, target_time, True
-else:
-    # Standard Countdown
-    if st.session_state.time_left > 0:
-        st.session_state.time_left -= 1
+# Only the timer + cards re-execute every second, not the whole script
+@st.fragment(run_every=1.0)
+def control_grid():
+    # Wrapper Logic
+    if st.session_state.mode == "Simulation":
+        sample = get_simulated_data()
+    elif st.session_state.mode == "AI Analysis":
+        if st.session_state.ai_data is None:
+            st.session_state.ai_data = get_simulated_data() # Default/Fallback
+        sample = st.session_state.ai_data
     else:
-        # Time expired, switch phase
+        sample = get_simulated_data() # Placeholder for Live Data
+
+    # Logic and Timer Management
+    target_active, target_time, target_emg = logic_engine(sample)
+
+    if st.session_state.override:
+        # Override Mode
+        active = st.session_state.override
+        timer = 999
+        is_emg = False
+        st.session_state.active_lane = active # Sync state
+    elif target_emg and not st.session_state.is_emg:
+        # Emergency Interrupt
         st.session_state.active_lane = target_active
         st.session_state.time_left = target_time
-        st.session_state.is_emg = target_emg
+        st.session_state.is_emg = True
+        active, timer, is_emg = target_active, target_time, True
+    else:
+        # Standard Countdown
+        if st.session_state.time_left > 0:
+            st.session_state.time_left -= 1
+        else:
+            # Time expired, switch phase
+            st.session_state.active_lane = target_active
+            st.session_state.time_left = target_time
+            st.session_state.is_emg = target_emg
     
-    active = st.session_state.active_lane
-    timer = st.session_state.time_left
-    is_emg = st.session_state.is_emg
-
-# --- MAIN GRID (Cross Layout) ---
-# Row 1: North (Center)
-r1_c1, r1_c2, r1_c3 = st.columns(3)
-with r1_c2:
-    st.markdown(card_html("N", data["N"], active=="N"), unsafe_allow_html=True)
-    if st.button("FORCE NORTH", key="btn_n", use_container_width=True):
-        st.session_state.override = "N"
-        st.rerun()
-
-# Row 2: West (Left) - Timer (Center) - East (Right)
-r2_c1, r2_c2, r2_c3 = st.columns(3)
-with r2_c1:
-    st.markdown(card_html("W", data["W"], active=="W"), unsafe_allow_html=True)
-    if st.button("FORCE WEST", key="btn_w", use_container_width=True):
-        st.session_state.override = "W"
-        st.rerun()
-with r2_c2:
-    st.write("") # Spacer
-    st.markdown(timer_html(timer, active, is_emg), unsafe_allow_html=True)
-    if st.button("RESET", key="reset_center", use_container_width=True):
-        st.session_state.override = None
-        st.rerun()
-with r2_c3:
-    st.markdown(card_html("E", data["E"], active=="E"), unsafe_allow_html=True)
-    if st.button("FORCE EAST", key="btn_e", use_container_width=True):
-        st.session_state.override = "E"
-        st.rerun()
-
-# Row 3: South (Center)
-r3_c1, r3_c2, r3_c3 = st.columns(3)
-with r3_c2:
-    st.markdown(card_html("S", data["S"], active=="S"), unsafe_allow_html=True)
-    if st.button("FORCE SOUTH", key="btn_s", use_container_width=True):
-        st.session_state.override = "S"
-        st.rerun()
+        active = st.session_state.active_lane
+        timer = st.session_state.time_left
+        is_emg = st.session_state.is_emg
+
+    # Share this tick's values with the metrics bar
+    st.session_state.tick_data = sample
+    st.session_state.tick_emg = is_emg
+
+    # --- MAIN GRID (Cross Layout) ---
+    # Row 1: North (Center)
+    r1_c1, r1_c2, r1_c3 = st.columns(3)
+    with r1_c2:
+        st.markdown(card_html("N", sample.densities[0], active=="N"), unsafe_allow_html=True)
+        if st.button("FORCE NORTH", key="btn_n", use_container_width=True):
+            st.session_state.override = "N"
+            st.rerun(scope="fragment")
+
+    # Row 2: West (Left) - Timer (Center) - East (Right)
+    r2_c1, r2_c2, r2_c3 = st.columns(3)
+    with r2_c1:
+        st.markdown(card_html("W", sample.densities[3], active=="W"), unsafe_allow_html=True)
+        if st.button("FORCE WEST", key="btn_w", use_container_width=True):
+            st.session_state.override = "W"
+            st.rerun(scope="fragment")
+    with r2_c2:
+        st.write("") # Spacer
+        st.markdown(timer_html(timer, active, is_emg), unsafe_allow_html=True)
+        if st.button("RESET", key="reset_center", use_container_width=True):
+            st.session_state.override = None
+            st.rerun(scope="fragment")
+    with r2_c3:
+        st.markdown(card_html("E", sample.densities[1], active=="E"), unsafe_allow_html=True)
+        if st.button("FORCE EAST", key="btn_e", use_container_width=True):
+            st.session_state.override = "E"
+            st.rerun(scope="fragment")
+
+    # Row 3: South (Center)
+    r3_c1, r3_c2, r3_c3 = st.columns(3)
+    with r3_c2:
+        st.markdown(card_html("S", sample.densities[2], active=="S"), unsafe_allow_html=True)
+        if st.button("FORCE SOUTH", key="btn_s", use_container_width=True):
+            st.session_state.override = "S"
+            st.rerun(scope="fragment")
+
+control_grid()
 
 st.write("")
 st.write("")
@@ -266,17 +337,23 @@ with ctrl_c4:
         st.session_state.run_analysis = False
 
 st.divider()
-# BOTTOM BAR (Metrics)
-m1, m2, m3 = st.columns(3)
-with m1:
-    aqi_col = "#00ff9d" if data["AQI"] < 100 else "#ffcc00"
-    st.markdown(metric_html("AIR QUALITY INDEX", data["AQI"], aqi_col), unsafe_allow_html=True)
-with m2:
-    st.markdown(metric_html("SYSTEM LATENCY", f"{data['Latency']}ms", "#00d4ff"), unsafe_allow_html=True)
-with m3:
-    emg_txt = "DETECTED" if is_emg else "NONE"
-    emg_col = "#ff0055" if is_emg else "#444" 
-    st.markdown(metric_html("EMERGENCY SCAN", emg_txt, emg_col), unsafe_allow_html=True)
+# BOTTOM BAR (Metrics) - refreshed from the values control_grid stored this tick
+@st.fragment(run_every=1.0)
+def metrics_bar():
+    sample = st.session_state.tick_data
+    is_emg = st.session_state.tick_emg
+    m1, m2, m3 = st.columns(3)
+    with m1:
+        aqi_col = "#00ff9d" if sample.aqi < 100 else "#ffcc00"
+        st.markdown(metric_html("AIR QUALITY INDEX", sample.aqi, aqi_col), unsafe_allow_html=True)
+    with m2:
+        st.markdown(metric_html("SYSTEM LATENCY", f"{sample.latency}ms", "#00d4ff"), unsafe_allow_html=True)
+    with m3:
+        emg_txt = "DETECTED" if is_emg else "NONE"
+        emg_col = "#ff0055" if is_emg else "#444" 
+        st.markdown(metric_html("EMERGENCY SCAN", emg_txt, emg_col), unsafe_allow_html=True)
+
+metrics_bar()
 
 if st.session_state.mode == "AI Analysis" and st.session_state.ai_images:
     st.write("")
@@ -285,17 +362,16 @@ if st.session_state.mode == "AI Analysis" and st.session_state.ai_images:
     st.markdown("### 📷 LIVE TRAFFIC VISUAL ANALYSIS")
     
     img_cols = st.columns(4)
-    directions = ["N", "E", "S", "W"]
     labels = {"N": "NORTH AVE", "E": "EAST AVE", "S": "SOUTH AVE", "W": "WEST AVE"}
     
-    for idx, d in enumerate(directions):
+    for idx, d in enumerate(LANES):
         with img_cols[idx]:
             img = st.session_state.ai_images.get(d)
-            density = st.session_state.ai_data.get(d, 0)
+            density = st.session_state.ai_data.densities[idx]
             
             st.markdown(f"**{labels[d]}**")
             if img is not None:
-                st.image(img, use_container_width=True, channels="RGB")
+                st.image(img, use_container_width=True, channels="BGR")
             else:
                 st.info("No Feed")
             
@@ -317,36 +393,42 @@ with st.sidebar:
         if st.session_state.run_analysis:
             with st.spinner("Analyzing Traffic Patterns..."):
                 analyzer = get_analyzer()
-                new_data = {}
+                densities = np.zeros(len(LANES), dtype=np.float32)
                 new_images = {}
                 ambulance_detected = False
                 
-                # Process each direction
+                # Decode each direction, then analyze all feeds in one batch
                 files = {'N': img_n, 'E': img_e, 'S': img_s, 'W': img_w}
+                pending = []
                 for direction, img_file in files.items():
+                    new_images[direction] = None
                     if img_file:
-                        file_bytes = np.asarray(bytearray(img_file.read()), dtype=np.uint8)
-                        img = cv2.imdecode(file_bytes, 1)
-                        # Analyzer now returns (count, density, annotated_bgr_img, has_ambulance)
-                        count, density, annotated_bgr, has_ambulance = analyzer.analyze_road_image(img)
-                        
-                        # Check for ambulance in any direction
-                        if has_ambulance:
-                            ambulance_detected = True
-                        
-                        # Convert Annotated BGR to RGB for Streamlit
-                        if annotated_bgr is not None:
-                            annotated_rgb = cv2.cvtColor(annotated_bgr, cv2.COLOR_BGR2RGB)
-                            new_images[direction] = annotated_rgb
-                        new_data[direction] = density
-                    else:
-                        new_images[direction] = None
-                        new_data[direction] = 0.0
+                        # Read-only view over the upload's bytes (no copy); imdecode accepts it
+                        file_bytes = np.frombuffer(img_file.getvalue(), dtype=np.uint8)
+                        # Decode at half resolution; YOLO downsizes to 640 anyway
+                        img = cv2.imdecode(file_bytes, cv2.IMREAD_REDUCED_COLOR_2)
+                        if img is not None:
+                            pending.append((direction, img))
+                
+                # Analyzer returns (count, density, annotated_bgr_img, has_ambulance) per image
+                batch_results = analyzer.analyze_road_images_batch([img for _, img in pending], annotate=True)
+                for (direction, _), (count, density, annotated_bgr, has_ambulance) in zip(pending, batch_results):
+                    # Check for ambulance in any direction
+                    if has_ambulance:
+                        ambulance_detected = True
+                    
+                    # Kept as BGR; st.image converts via channels="BGR"
+                    if annotated_bgr is not None:
+                        new_images[direction] = annotated_bgr
+                    densities[LANES.index(direction)] = density
 
                 # Set emergency flag if ambulance detected
-                new_data["Emg"] = 1 if ambulance_detected else 0
-                new_data["AQI"] = np.random.randint(40, 80)
-                new_data["Latency"] = np.random.randint(100, 300)
+                new_data = TrafficSample(
+                    densities=densities,
+                    emg=1 if ambulance_detected else 0,
+                    aqi=np.random.randint(40, 80),
+                    latency=np.random.randint(100, 300)
+                )
                 
                 if ambulance_detected:
                     st.success("🚨 AMBULANCE DETECTED! Emergency mode activated.")
@@ -358,6 +440,4 @@ with st.sidebar:
     else:
         st.info("Switch to 'AI Analysis' mode to upload feeds")
 
-# Auto Refresh Loop
-# time.sleep(1)
-# st.rerun()
+# Auto Refresh: handled by the run_every fragments above
@@ -0,0 +1,83 @@
+"""
+INT8 TensorRT Export
+Calibrates the custom model to an INT8 engine on the training dataset and keeps it
+only if validation mAP50 stays within MAX_MAP_DROP of the FP16 engine.
+The pipelines pick up <stem>_b8_int8.engine automatically (model_registry.cached_engine).
+"""
+
+import os
+import sys
+import shutil
+from pathlib import Path
+import torch
+
+sys.path.insert(0, str(Path(__file__).parent))
+from ultralytics import YOLO
+from model_registry import cached_engine, int8_engine_path
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(CURRENT_DIR, "custom_model.pt")
+DATASET_YAML = os.path.join(CURRENT_DIR, "training", "dataset", "data.yaml")
+
+ENGINE_BATCH = 8
+MAX_MAP_DROP = 0.02  # Largest accepted mAP50 drop vs FP16 (2 percentage points)
+
+
+def evaluate(engine_path):
+    """Validation mAP50 of an engine on the dataset's val split."""
+    metrics = YOLO(engine_path, task='detect').val(
+        data=DATASET_YAML, imgsz=640, batch=ENGINE_BATCH, device=0, plots=False, verbose=False
+    )
+    return metrics.box.map50
+
+
+def export_int8(model_path=MODEL_PATH):
+    """
+    Export model_path to an INT8 TensorRT engine and validate it against the FP16 engine.
+    TensorRT's entropy calibrator runs on images from data.yaml; the calibration cache
+    (<stem>_b8_int8.cache) is kept so re-exports skip calibration.
+    Returns: path of the engine to use (INT8 if accepted, otherwise FP16)
+    """
+    if not torch.cuda.is_available():
+        print("❌ TensorRT export needs a CUDA GPU.")
+        return None
+    if not os.path.exists(model_path) or not os.path.exists(DATASET_YAML):
+        print("❌ Model or dataset not found! Please run setup_training.py and train.py first.")
+        return None
+    
+    fp16_path = cached_engine(model_path, batch=ENGINE_BATCH)
+    int8_path = int8_engine_path(model_path, ENGINE_BATCH)
+    if Path(fp16_path) == int8_path:
+        print(f"✅ INT8 engine already exported: {int8_path}")
+        return str(int8_path)
+    
+    # Export from a copy so the engine (and calibration cache) get the _int8 name
+    # and don't overwrite the FP16 engine
+    int8_pt = int8_path.with_suffix('.pt')
+    shutil.copy(model_path, int8_pt)
+    try:
+        print(f"🔄 Exporting {os.path.basename(model_path)} to TensorRT (INT8)...")
+        YOLO(str(int8_pt)).export(
+            format='engine', int8=True, data=DATASET_YAML,
+            dynamic=True, batch=ENGINE_BATCH, imgsz=640, workspace=4
+        )
+    finally:
+        int8_pt.unlink()
+    
+    print("📊 Validating engines...")
+    fp16_map = evaluate(fp16_path)
+    int8_map = evaluate(str(int8_path))
+    print(f"   FP16 mAP50: {fp16_map:.3f}")
+    print(f"   INT8 mAP50: {int8_map:.3f}")
+    
+    if fp16_map - int8_map > MAX_MAP_DROP:
+        int8_path.unlink()
+        print(f"⚠️  INT8 accuracy drop above {MAX_MAP_DROP:.0%}; keeping the FP16 engine: {fp16_path}")
+        return fp16_path
+    
+    print(f"✅ INT8 engine saved to: {int8_path}")
+    return str(int8_path)
+
+
+if __name__ == "__main__":
+    export_int8(sys.argv[1] if len(sys.argv) > 1 else MODEL_PATH)
@@ -9,15 +9,27 @@ Handles automatic image capture from multiple sources:
 import cv2
 import os
 import sys
+import time
+import queue
+import threading
 import requests
 import numpy as np
 from datetime import datetime
 from pathlib import Path
 
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420
+    _tj = TurboJPEG()
+except Exception:  # PyTurboJPEG/libjpeg-turbo are optional; fall back to cv2.imwrite
+    _tj = None
+
 # Add project directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 from config import CAPTURES_FOLDER, CAMERA_SOURCE, IMAGE_WIDTH, IMAGE_HEIGHT, VERBOSE, REQUEST_TIMEOUT
 
+# A producer frame older than this (seconds) means the camera stopped delivering
+MAX_FRAME_AGE = 1.5
+
 
 class ImageCapture:
     """Handles automatic image capture from multiple sources."""
@@ -32,6 +44,22 @@ class ImageCapture:
         )
         self.is_webcam = isinstance(camera_source, int)
         
+        # Pooled HTTP session plus ETag of the last snapshot for conditional GETs
+        self._session = requests.Session()
+        self._etag = None
+        self._last_frame = None
+        
+        # Camera producer thread keeps only the most recent frame (single slot)
+        self._lock = threading.Lock()
+        self._latest = None
+        self._latest_time = 0.0  # time.monotonic() when _latest was read
+        self._producer_thread = None
+        self._running = False
+        
+        # JPEG encode + disk write happen on a background thread so capture isn't blocked
+        self._wq = queue.Queue(maxsize=2)
+        threading.Thread(target=self._writer_loop, daemon=True).start()
+        
         self.create_captures_folder()
     
     def create_captures_folder(self):
@@ -42,12 +70,13 @@ class ImageCapture:
     
     def connect_camera(self):
         """Connect to camera source."""
+        self._reset_latest()
         try:
             if self.is_http:
                 # HTTP URL - test connection with GET request
                 if VERBOSE:
                     print(f"[CAPTURE] Testing HTTP image source: {self.camera_source}...")
-                response = requests.get(self.camera_source, timeout=REQUEST_TIMEOUT)
+                response = self._session.get(self.camera_source, timeout=REQUEST_TIMEOUT)
                 if response.status_code == 200:
                     if VERBOSE:
                         print("[CAPTURE] ✓ HTTP image source connected successfully")
@@ -63,6 +92,11 @@ class ImageCapture:
                 self.camera = cv2.VideoCapture(self.camera_source)
                 
                 if self.camera.isOpened():
+                    # Keep only the newest frame in the driver queue
+                    if not self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1):
+                        print("[CAPTURE] ⚠ Camera backend ignored CAP_PROP_BUFFERSIZE")
+                    # MJPG lets the camera compress on-device and keeps USB bandwidth low
+                    self.camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
                     self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, IMAGE_WIDTH)
                     self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, IMAGE_HEIGHT)
                     self.camera.set(cv2.CAP_PROP_FPS, 30)
@@ -79,6 +113,9 @@ class ImageCapture:
                     print(f"[CAPTURE] Connecting to IP camera at {self.camera_source}...")
                 self.camera = cv2.VideoCapture(self.camera_source)
                 if self.camera.isOpened():
+                    # Keep only the newest frame in the driver queue
+                    if not self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1):
+                        print("[CAPTURE] ⚠ Camera backend ignored CAP_PROP_BUFFERSIZE")
                     if VERBOSE:
                         print("[CAPTURE] ✓ IP camera connected successfully")
                     return True
@@ -93,7 +130,14 @@ class ImageCapture:
     def capture_frame_from_http(self):
         """Capture frame from HTTP URL."""
         try:
-            response = requests.get(self.camera_source, timeout=REQUEST_TIMEOUT)
+            headers = {"If-None-Match": self._etag} if self._etag else {}
+            response = self._session.get(
+                self.camera_source, headers=headers, timeout=REQUEST_TIMEOUT, stream=False
+            )
+            
+            if response.status_code == 304 and self._last_frame is not None:
+                # Snapshot unchanged since last request - reuse the decoded frame
+                return self._last_frame
             
             if response.status_code == 200:
                 # Convert response to numpy array
@@ -101,6 +145,8 @@ class ImageCapture:
                 # Decode image
                 frame = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
                 if frame is not None:
+                    self._last_frame = frame
+                    self._etag = response.headers.get("ETag")
                     return frame
                 else:
                     print("[CAPTURE] ✗ Failed to decode image from HTTP response")
@@ -119,16 +165,51 @@ class ImageCapture:
             print(f"[CAPTURE] ✗ Error capturing from HTTP: {e}")
             return None
     
+    def _producer(self):
+        """Background thread: keep reading the camera and hold on to the newest frame."""
+        while self._running and self.camera is not None and self.camera.isOpened():
+            ret, frame = self.camera.read()
+            if ret:
+                with self._lock:
+                    self._latest = frame
+                    self._latest_time = time.monotonic()
+            else:
+                time.sleep(0.01)
+    
+    def _reset_latest(self):
+        """Forget the producer's last frame (after disconnect / before reconnect)."""
+        with self._lock:
+            self._latest = None
+            self._latest_time = 0.0
+    
+    def _start_producer(self):
+        """Start the camera producer thread if it isn't already running."""
+        if self._producer_thread is not None and self._producer_thread.is_alive():
+            return
+        self._running = True
+        self._producer_thread = threading.Thread(target=self._producer, daemon=True)
+        self._producer_thread.start()
+    
     def capture_frame_from_camera(self):
-        """Capture frame from webcam or IP camera."""
+        """Capture frame from webcam or IP camera (latest frame from the producer thread)."""
         try:
             if self.camera is None or not self.camera.isOpened():
                 if not self.connect_camera():
                     return None
+            self._start_producer()
             
-            ret, frame = self.camera.read()
+            # Right after connecting the producer may not have a frame yet.
+            # Frames older than MAX_FRAME_AGE are stale (reads failing) and never returned
+            deadline = time.time() + 1.0
+            while True:
+                with self._lock:
+                    fresh = self._latest is not None and time.monotonic() - self._latest_time <= MAX_FRAME_AGE
+                    frame = self._latest.copy() if fresh else None
+                if frame is not None or time.time() > deadline:
+                    break
+                time.sleep(0.01)
             
-            if ret:
+            if frame is not None:
                 return frame
             else:
                 print("[CAPTURE] ✗ Failed to read frame from camera")
@@ -150,8 +231,45 @@ class ImageCapture:
             print(f"[CAPTURE] ✗ Error in capture_frame: {e}")
             return None
     
+    def _writer_loop(self):
+        """Background thread: encode and write queued frames to disk."""
+        while True:
+            filepath, frame = self._wq.get()
+            try:
+                if _tj is not None:
+                    data = _tj.encode(frame, quality=85, jpeg_subsample=TJSAMP_420)
+                    success = True
+                else:
+                    ext = os.path.splitext(filepath)[1] or ".jpg"
+                    success, buf = cv2.imencode(
+                        ext, frame, [cv2.IMWRITE_JPEG_QUALITY, 85, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+                    )
+                    data = buf.tobytes() if success else None
+                
+                if success:
+                    # Write under a temporary name and rename into place, so the
+                    # final path only ever appears fully written
+                    tmp_path = filepath + ".tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp_path, filepath)
+                    
+                    self.image_count += 1
+                    if VERBOSE:
+                        print(f"[CAPTURE] ✓ Saved: {os.path.basename(filepath)}")
+                else:
+                    print(f"[CAPTURE] ✗ Failed to save {os.path.basename(filepath)}")
+            
+            except Exception as e:
+                print(f"[CAPTURE] ✗ Error saving image: {e}")
+            finally:
+                self._wq.task_done()
+    
     def save_image(self, frame, filename=None):
-        """Save captured frame to file."""
+        """
+        Queue captured frame to be saved to file.
+        Returns the target path, or None if the writer is still busy and the frame was dropped.
+        """
         try:
             if frame is None:
                 return None
@@ -162,30 +280,37 @@ class ImageCapture:
             
             filepath = os.path.join(self.captures_folder, filename)
             
-            success = cv2.imwrite(filepath, frame)
-            
-            if success:
-                self.image_count += 1
-                if VERBOSE:
-                    print(f"[CAPTURE] ✓ Saved: {filename}")
-                return filepath
-            else:
-                print(f"[CAPTURE] ✗ Failed to save {filename}")
-                return None
+            # Late frames are dropped rather than letting the backlog grow
+            self._wq.put_nowait((filepath, frame))
+            return filepath
         
+        except queue.Full:
+            print(f"[CAPTURE] ✗ Writer busy, dropped {filename}")
+            return None
         except Exception as e:
             print(f"[CAPTURE] ✗ Error saving image: {e}")
             return None
     
     def capture_and_save(self):
-        """Capture one frame and save it."""
+        """
+        Capture one frame and save it.
+        Returns: (filepath, frame) so callers can use the frame without reading the file back,
+        or None if nothing was captured/queued for saving
+        """
         frame = self.capture_frame()
         if frame is not None:
-            return self.save_image(frame)
+            filepath = self.save_image(frame)
+            if filepath:
+                return filepath, frame
         return None
     
     def disconnect(self):
-        """Disconnect camera."""
+        """Flush pending writes and disconnect camera."""
+        self._wq.join()
+        self._running = False
+        if self._producer_thread is not None:
+            self._producer_thread.join(timeout=1.0)
+        self._reset_latest()
         if self.camera is not None:
             self.camera.release()
             if VERBOSE:
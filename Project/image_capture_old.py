@@ -53,6 +53,9 @@ class ImageCapture:
             self.camera.set(cv2.CAP_PROP_FPS, 30)
             
             if self.camera.isOpened():
+                # Keep only the newest frame in the driver queue
+                if not self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1):
+                    print("[CAPTURE] ⚠ Camera backend ignored CAP_PROP_BUFFERSIZE")
                 if VERBOSE:
                     print("[CAPTURE] ✓ Camera connected successfully")
                 return True
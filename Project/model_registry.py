@@ -0,0 +1,90 @@
+"""
+Model Registry
+Process-wide cache of loaded YOLO models shared by the pipeline scripts
+"""
+
+import os
+import functools
+from pathlib import Path
+import torch
+from ultralytics import YOLO
+
+
+@functools.lru_cache(maxsize=4)
+def get_yolo(model_path, task=None):
+    """
+    Load a YOLO model once per process and reuse it.
+    Repeated calls with the same path return the same, already initialized model,
+    so the checkpoint is not re-parsed and GPU memory is not reallocated.
+    """
+    return YOLO(model_path, task=task)
+
+
+def cached_export(model_path, format, suffix, **export_kwargs):
+    """
+    Export a .pt model once and reuse the file on later runs.
+    Ultralytics writes the export next to the checkpoint as <stem><suffix>;
+    if that file already exists the export step is skipped.
+    Returns: path of the exported model
+    """
+    export_path = Path(model_path).with_suffix(suffix)
+    if not export_path.exists():
+        export_path = Path(YOLO(model_path).export(format=format, **export_kwargs))
+    return str(export_path)
+
+
+def engine_path(model_path, batch, precision):
+    """
+    Path of a TensorRT engine built for a given max batch and precision
+    (e.g. custom_model.pt, 8, 'fp16' -> custom_model_b8_fp16.engine).
+    The engine's batch limit is fixed at export, so it is part of the cache key.
+    """
+    path = Path(model_path)
+    return path.with_name(f"{path.stem}_b{batch}_{precision}.engine")
+
+
+def int8_engine_path(model_path, batch=8):
+    """Path of the INT8 engine written by export_int8.py (e.g. custom_model.pt -> custom_model_b8_int8.engine)."""
+    return engine_path(model_path, batch, 'int8')
+
+
+def cached_engine(model_path, batch=8):
+    """
+    Export a .pt model to a TensorRT engine once (dynamic batch up to `batch`, 640px).
+    An INT8 engine for the same batch that passed the accuracy check in export_int8.py is preferred.
+    FP16 needs Tensor Cores (compute capability 7.0+); older cards such as Pascal
+    get an FP32 engine instead.
+    Returns: path of the .engine file
+    """
+    int8_path = int8_engine_path(model_path, batch)
+    if int8_path.exists():
+        return str(int8_path)
+    
+    half = torch.cuda.get_device_capability()[0] >= 7
+    target = engine_path(model_path, batch, 'fp16' if half else 'fp32')
+    if not target.exists():
+        # Ultralytics always writes <stem>.engine; rename it to the batch/precision-specific name
+        exported = YOLO(model_path).export(format='engine', half=half, imgsz=640,
+                                           dynamic=True, batch=batch, workspace=4)
+        os.replace(exported, target)
+    return str(target)
+
+
+def compile_yolo(model):
+    """
+    Fuse Conv+BN and wrap the network in torch.compile (CUDA graphs via 'reduce-overhead').
+    Call after one warmup inference so the predictor exists; the compiled module replaces
+    the one the predictor runs. Only PyTorch weights on CUDA with torch 2.x are compiled.
+    Returns: True if the model was compiled
+    """
+    if not (hasattr(torch, 'compile') and torch.cuda.is_available()):
+        return False
+    predictor = getattr(model, 'predictor', None)
+    backend = getattr(predictor, 'model', None)
+    if backend is None or not isinstance(getattr(backend, 'model', None), torch.nn.Module):
+        return False  # exported backends (TensorRT, ONNX, ...) are already fused
+    if hasattr(backend.model, '_orig_mod'):
+        return False  # already compiled (shared model from get_yolo); don't recompile / recapture
+    
+    backend.model = torch.compile(backend.model.fuse(verbose=False), mode='reduce-overhead', fullgraph=False)
+    return True
@@ -1,7 +1,9 @@
 import os
 import shutil
 import glob
-from ultralytics import YOLO
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from model_registry import get_yolo
 import cv2
 
 # Define paths
@@ -24,6 +26,12 @@ LBL_DIR_VAL = os.path.join(DATASET_DIR, "labels", "val")
 CLASS_MAP = {2: 0, 3: 0, 5: 0, 7: 0}  # car, motorcycle, bus, truck -> vehicle (class 0)
 # Ambulance (class 1) will need to be manually labeled in the dataset
 
+# YOLO label format: class x_center y_center width height (normalized)
+LABEL_FMT = ['%d', '%.6f', '%.6f', '%.6f', '%.6f']
+
+# Images per auto-labeling forward pass
+LABEL_BATCH_SIZE = 16
+
 def setup():
     print(f"Scanning for images in {SOURCE_IMG_DIR}...")
     images = glob.glob(os.path.join(SOURCE_IMG_DIR, "*.*"))
@@ -44,13 +52,14 @@ def setup():
 
     # 2. Load Model for Auto-labeling
     print("Loading model for auto-labeling...")
-    model = YOLO("yolov8m.pt")
+    model = get_yolo("yolov8m.pt")
 
     # 3. Process Images
     # Simple split: 80% train, 20% val
     split_idx = int(len(images) * 0.8)
     if split_idx == 0 and len(images) > 0: split_idx = 1 # at least 1 for train if very few
 
+    destinations = []
     for i, img_path in enumerate(images):
         filename = os.path.basename(img_path)
         
@@ -60,29 +69,35 @@ def setup():
         else:
             dest_img_dir = IMG_DIR_VAL
             dest_lbl_dir = LBL_DIR_VAL
-            
-        # Copy Image
-        dest_img_path = os.path.join(dest_img_dir, filename)
-        shutil.copy(img_path, dest_img_path)
-        
-        # Auto-Label with low confidence to pick up toy cars
-        # Using 0.15 to filter noise but catch the buses/trucks (which we map to car)
-        results = model(dest_img_path, verbose=False, conf=0.15)
-        result = results[0]
         
-        # We need to save labels in YOLO format
         label_filename = os.path.splitext(filename)[0] + ".txt"
-        label_path = os.path.join(dest_lbl_dir, label_filename)
+        destinations.append((os.path.join(dest_img_dir, filename), os.path.join(dest_lbl_dir, label_filename)))
+    
+    # Copy images on worker threads while the GPU labels the originals
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        copies = [pool.submit(shutil.copyfile, img_path, dest_img_path)
+                  for img_path, (dest_img_path, _) in zip(images, destinations)]
         
-        with open(label_path, "w") as f:
-            for box in result.boxes:
-                cls_id = int(box.cls[0])
-                if cls_id in CLASS_MAP:
-                    x, y, w, h = box.xywhn[0].tolist()
-                    new_cls = CLASS_MAP[cls_id]
-                    f.write(f"{new_cls} {x} {y} {w} {h}\n")
+        for start in range(0, len(images), LABEL_BATCH_SIZE):
+            chunk = images[start:start + LABEL_BATCH_SIZE]
+            
+            # Auto-Label with low confidence to pick up toy cars
+            # Using 0.15 to filter noise but catch the buses/trucks (which we map to car)
+            results = model(chunk, verbose=False, conf=0.15, imgsz=640)
+            
+            for img_path, (_, label_path), result in zip(chunk, destinations[start:], results):
+                # We need to save labels in YOLO format
+                cls = result.boxes.cls.cpu().numpy().astype(int)
+                xywhn = result.boxes.xywhn.cpu().numpy()
+                mask = np.isin(cls, list(CLASS_MAP))
+                new_cls = np.array([CLASS_MAP[c] for c in cls[mask]], dtype=int)
+                np.savetxt(label_path, np.column_stack([new_cls, xywhn[mask]]), fmt=LABEL_FMT)
+                
+                print(f"Processed {os.path.basename(img_path)}")
         
-        print(f"Processed {filename}")
+        # Surface any copy errors
+        for copy in copies:
+            copy.result()
 
     # 4. Create data.yaml
     yaml_content = f"""
@@ -7,34 +7,73 @@ Focuses only on vehicles present in dataset (cars + ambulances)
 import os
 import cv2
 import time
+import numpy as np
+import torch
+import queue
 import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import sys
 from datetime import datetime
 from pathlib import Path
-from ultralytics import YOLO
 
 # Add project directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 from config import (
     MODEL_PATH, CAPTURES_FOLDER, CAPTURE_INTERVAL, NUM_ROADS,
-    VEHICLE_CLASSES, CONFIDENCE_THRESHOLD, VERBOSE
+    VEHICLE_CLASSES, CONFIDENCE_THRESHOLD, VERBOSE, BATCH_SIZE
 )
 from image_capture import ImageCapture
 from thingspeak_client import ThingSpeakClient
+from model_registry import get_yolo, cached_engine, compile_yolo
+from capture_watcher import start_watcher
+
+
+# Dataset class ids counted per road (config: car, ambulance)
+CAR_CLASS, AMBULANCE_CLASS = VEHICLE_CLASSES
+
+# Per-road density: < 3 vehicles LOW, < 8 MEDIUM, else HIGH
+DENSITY_BOUNDS = np.array([3, 8])
+DENSITY_LABELS = np.array(["LOW", "MEDIUM", "HIGH"])
+
+# Most recent processed paths remembered for de-duplication
+MAX_PROCESSED_FILES = 10000
+
+# Frames larger than 1080p are shrunk to fit 1280x720 before detection
+MAX_DETECT_SIZE = (1920, 1080)
+DETECT_SIZE = (1280, 720)
+
+
+def downscale_for_detection(frame):
+    """Shrink frames above 1080p to fit DETECT_SIZE (aspect kept); smaller frames pass through."""
+    height, width = frame.shape[:2]
+    if width <= MAX_DETECT_SIZE[0] and height <= MAX_DETECT_SIZE[1]:
+        return frame
+    scale = min(DETECT_SIZE[0] / width, DETECT_SIZE[1] / height)
+    return cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
 
 
 class SmartTrafficSystem:
     """Complete automatic traffic management system."""
     
     def __init__(self):
-        self.processed_files = set()
+        # Shared by the capture and detection workers; bounded LRU of processed paths
+        self.processed_files = OrderedDict()
+        self.processed_count = 0
+        self.processed_lock = threading.Lock()
         self.model = None
+        # FP16 inference on CUDA, FP32 on CPU
+        self.half = torch.cuda.is_available()
+        self.device = 0 if self.half else 'cpu'
         self.capturer = None
         self.thingspeak = None
         self.running = False
         
-        # Initialize components
-        self.setup_system()
+        # ThingSpeak uploads run on their own thread, off the detection path
+        self._ts_queue = queue.Queue(maxsize=32)
+        threading.Thread(target=self._thingspeak_worker, daemon=True).start()
+        
+        # Components are initialized by run() -> setup_system()
     
     def setup_system(self):
         """Initialize all system components."""
@@ -42,24 +81,48 @@ class SmartTrafficSystem:
         print("SMART TRAFFIC MANAGEMENT SYSTEM - AUTO PIPELINE")
         print("="*70)
         
-        # Load YOLO model (vehicles only)
-        print("\n[SETUP] Loading YOLO model (vehicles only)...")
-        try:
-            if os.path.exists(MODEL_PATH):
-                self.model = YOLO(MODEL_PATH)
-                print(f"[SETUP] ✓ Custom model loaded: {MODEL_PATH}")
-            else:
-                print(f"[SETUP] ⚠ Custom model not found. Using yolov8m.pt")
-                self.model = YOLO("yolov8m.pt")
-        except Exception as e:
-            print(f"[SETUP] ✗ Error loading model: {e}")
-            return False
+        # Load YOLO model (vehicles only), once per instance
+        if self.model is None:
+            print("\n[SETUP] Loading YOLO model (vehicles only)...")
+            try:
+                if os.path.exists(MODEL_PATH):
+                    model_path = MODEL_PATH
+                    print(f"[SETUP] ✓ Custom model found: {MODEL_PATH}")
+                else:
+                    print(f"[SETUP] ⚠ Custom model not found. Using yolov8m.pt")
+                    model_path = "yolov8m.pt"
+                
+                # On CUDA, export a TensorRT engine once and load that instead of the .pt
+                if torch.cuda.is_available():
+                    try:
+                        model_path = cached_engine(model_path, batch=BATCH_SIZE)
+                        print(f"[SETUP] ✓ Using TensorRT engine: {model_path}")
+                    except Exception as e:
+                        print(f"[SETUP] ⚠ TensorRT export failed, using PyTorch weights: {e}")
+                
+                self.model = get_yolo(model_path, task='detect')
+            except Exception as e:
+                print(f"[SETUP] ✗ Error loading model: {e}")
+                return False
+            
+            # Warmup so the first real frame isn't cold (weights paged in, cuDNN autotuned)
+            dummy = np.zeros((640, 640, 3), dtype=np.uint8)
+            for _ in range(3):
+                self.model(dummy, verbose=False, half=self.half, device=self.device, imgsz=640)
+            
+            # PyTorch weights on CUDA: fuse + torch.compile, then capture the CUDA graphs
+            if compile_yolo(self.model):
+                for _ in range(3):
+                    self.model(dummy, verbose=False, half=self.half, device=self.device, imgsz=640)
+                print("[SETUP] ✓ Model compiled with torch.compile")
+        print(f"[SETUP] ✓ Model ready on {'CUDA (FP16)' if self.half else 'CPU (FP32)'}")
         
-        # Initialize image capture
-        print("\n[SETUP] Initializing camera system...")
-        self.capturer = ImageCapture()
-        if not self.capturer.connect_camera():
-            print("[SETUP] ⚠ Camera connection failed. Will use manual captures only.")
+        # Initialize image capture (a second ImageCapture would reopen the camera and leak the first)
+        if self.capturer is None:
+            print("\n[SETUP] Initializing camera system...")
+            self.capturer = ImageCapture()
+            if not self.capturer.connect_camera():
+                print("[SETUP] ⚠ Camera connection failed. Will use manual captures only.")
         
         # Initialize ThingSpeak
         print("\n[SETUP] Initializing ThingSpeak connection...")
@@ -84,71 +147,81 @@ class SmartTrafficSystem:
         Focuses on dataset classes only, no overfitting.
         """
         try:
-            image = cv2.imread(image_path)
-            if image is None:
-                return None
+            # Run YOLO inference (YOLO decodes the file; its size comes from orig_shape)
+            results = self.model(image_path, verbose=False, conf=CONFIDENCE_THRESHOLD,
+                                 half=self.half, device=self.device, imgsz=640)
+            result = results[0]
+            
+            image_height, image_width = result.orig_shape
+            return self._tally_result(result, image_width)
+        
+        except Exception as e:
+            print(f"[DETECTION] ✗ Error: {e}")
+            return None
+    
+    def detect_vehicles_batch(self, images):
+        """
+        Detect vehicles in several images (paths or decoded frames) with one YOLO call.
+        Returns: list of road_data dicts (None for failed images), in input order
+        """
+        try:
+            # Stream results so each one is tallied and released before the next is produced
+            road_data_list = []
+            for result in self.model(images, verbose=False, conf=CONFIDENCE_THRESHOLD, stream=True,
+                                     half=self.half, device=self.device, imgsz=640):
+                road_data_list.append(self._tally_result(result, result.orig_shape[1]))
+                del result
+            return road_data_list
+        
+        except Exception as e:
+            print(f"[DETECTION] ✗ Error: {e}")
+            return [None] * len(images)
+    
+    def _tally_result(self, result, image_width):
+        """Count cars / ambulances per road from one YOLO result."""
+        try:
+            cars = np.zeros(NUM_ROADS, dtype=np.int64)
+            ambulances = np.zeros(NUM_ROADS, dtype=np.int64)
             
-            image_height, image_width = image.shape[:2]
+            # Process detections (vehicles only)
+            # Counting stays on the inference device; only the 2 x NUM_ROADS counts are copied back
+            if result.boxes is not None:
+                boxes = result.boxes.xyxy
+                classes = result.boxes.cls.long()
+                
+                # Determine road of every box from its center x
+                centers = 0.5 * (boxes[:, 0] + boxes[:, 2])
+                road_ids = torch.div(centers, image_width // NUM_ROADS, rounding_mode='floor').long()
+                road_ids = torch.clamp(road_ids, 0, NUM_ROADS - 1)
+                
+                # Count by type (other classes are ignored)
+                cars = torch.bincount(road_ids[classes == CAR_CLASS], minlength=NUM_ROADS).cpu().numpy()
+                ambulances = torch.bincount(road_ids[classes == AMBULANCE_CLASS], minlength=NUM_ROADS).cpu().numpy()
             
-            # Run YOLO inference
-            results = self.model(image, verbose=False, conf=CONFIDENCE_THRESHOLD)
+            # Classify density
+            totals = cars + ambulances
+            densities = DENSITY_LABELS[np.searchsorted(DENSITY_BOUNDS, totals, side='right')]
             
-            # Initialize road data
             road_data = {}
             for road_id in range(NUM_ROADS):
                 road_data[road_id] = {
-                    "cars": 0,
-                    "ambulances": 0,
-                    "total": 0,
-                    "density": "LOW"
+                    "cars": int(cars[road_id]),
+                    "ambulances": int(ambulances[road_id]),
+                    "total": int(totals[road_id]),
+                    "density": str(densities[road_id])
                 }
             
-            # Process detections (vehicles only)
-            if results and len(results) > 0:
-                result = results[0]
-                
-                if result.boxes is not None:
-                    boxes = result.boxes.xyxy.cpu().numpy()
-                    classes = result.boxes.cls.cpu().numpy().astype(int)
-                    
-                    for box, cls_id in zip(boxes, classes):
-                        # Only process vehicle classes (0=car, 1=ambulance)
-                        if cls_id not in VEHICLE_CLASSES:
-                            continue
-                        
-                        x_min, y_min, x_max, y_max = box
-                        center_x = (x_min + x_max) / 2
-                        
-                        # Determine road
-                        road_id = int(center_x // (image_width // NUM_ROADS))
-                        road_id = min(road_id, NUM_ROADS - 1)
-                        
-                        # Count by type
-                        if cls_id == 0:
-                            road_data[road_id]["cars"] += 1
-                        elif cls_id == 1:
-                            road_data[road_id]["ambulances"] += 1
-                        
-                        road_data[road_id]["total"] += 1
-            
-            # Classify density
-            for road_id in road_data:
-                total = road_data[road_id]["total"]
-                if total < 3:
-                    road_data[road_id]["density"] = "LOW"
-                elif total < 8:
-                    road_data[road_id]["density"] = "MEDIUM"
-                else:
-                    road_data[road_id]["density"] = "HIGH"
-            
             return road_data
         
         except Exception as e:
             print(f"[DETECTION] ✗ Error: {e}")
             return None
     
-    def process_image(self, image_path):
-        """Process single image and send to ThingSpeak."""
+    def process_image(self, image_path, road_data=None):
+        """
+        Process single image and send to ThingSpeak.
+        road_data can be passed in when the image was already detected as part of a batch.
+        """
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         filename = os.path.basename(image_path)
         
@@ -156,7 +229,8 @@ class SmartTrafficSystem:
         print("-" * 70)
         
         # Detect vehicles
-        road_data = self.detect_vehicles(image_path)
+        if road_data is None:
+            road_data = self.detect_vehicles(image_path)
         if road_data is None:
             print("  [SKIP] Detection failed")
             return
@@ -182,20 +256,47 @@ class SmartTrafficSystem:
               f"({total_cars} cars, {total_ambulances} ambulances)")
         
         if self.thingspeak:
-            self.thingspeak.send_traffic_data(road_data)
+            try:
+                self._ts_queue.put_nowait(road_data)
+            except queue.Full:
+                # Uplink stalled - drop this update rather than hold up detection
+                print("  [THINGSPEAK] ⚠ Upload queue full, update dropped")
         
         print("-" * 70)
     
-    def capture_loop(self):
+    def _mark_processed(self, filepath):
+        """Remember a processed path, evicting the oldest once MAX_PROCESSED_FILES is reached."""
+        with self.processed_lock:
+            self.processed_files[filepath] = None
+            self.processed_count += 1
+            if len(self.processed_files) > MAX_PROCESSED_FILES:
+                self.processed_files.popitem(last=False)
+    
+    def _thingspeak_worker(self):
+        """Background thread: send queued road data to ThingSpeak."""
+        while True:
+            road_data = self._ts_queue.get()
+            try:
+                self.thingspeak.send_traffic_data(road_data)
+            except Exception as e:
+                print(f"[THINGSPEAK] ✗ Error: {e}")
+    
+    def capture_loop(self, file_queue):
         """Continuously capture images and add to queue."""
         print(f"\n[CAPTURE] Starting auto-capture loop (interval: {CAPTURE_INTERVAL}s)")
         
         while self.running:
             try:
                 if self.capturer:
-                    filepath = self.capturer.capture_and_save()
-                    if filepath:
-                        self.processed_files.add(filepath)
+                    # (filepath, frame): detection uses the in-memory frame directly
+                    captured = self.capturer.capture_and_save()
+                    # Blocks while detection is behind (bounded queue = backpressure)
+                    while captured and self.running:
+                        try:
+                            file_queue.put(captured, timeout=1.0)
+                            break
+                        except queue.Full:
+                            continue
                 
                 time.sleep(CAPTURE_INTERVAL)
             
@@ -205,33 +306,68 @@ class SmartTrafficSystem:
                 print(f"[CAPTURE] ✗ Error: {e}")
                 time.sleep(CAPTURE_INTERVAL)
     
-    def detection_loop(self):
-        """Continuously process new images."""
+    def detection_loop(self, file_queue):
+        """Process new images from the capture loop and the folder watcher."""
         print(f"\n[DETECTION] Starting detection loop")
         
-        while self.running:
-            try:
-                if not os.path.exists(CAPTURES_FOLDER):
-                    time.sleep(2)
-                    continue
-                
-                # Check for new images
-                for filename in sorted(os.listdir(CAPTURES_FOLDER)):
-                    if filename.lower().endswith(('.jpg', '.png', '.jpeg', '.bmp')):
-                        filepath = os.path.join(CAPTURES_FOLDER, filename)
-                        
-                        if filepath not in self.processed_files and os.path.isfile(filepath):
-                            time.sleep(0.5)  # Wait for write to complete
-                            self.process_image(filepath)
-                            self.processed_files.add(filepath)
+        # Folder events (inotify on Linux) instead of polling os.listdir.
+        # The watcher gets its own unbounded queue so the startup backlog can't fill the
+        # bounded capture hand-off and block this thread before it starts consuming.
+        watch_queue = queue.Queue()
+        observer = start_watcher(CAPTURES_FOLDER, watch_queue)
+        
+        try:
+            while self.running:
+                try:
+                    # Wait for one new image (captures first), then take whatever else is ready up to BATCH_SIZE
+                    try:
+                        batch = [file_queue.get(timeout=0.2)]
+                    except queue.Empty:
+                        try:
+                            batch = [watch_queue.get(timeout=0.8)]
+                        except queue.Empty:
+                            continue
+                    for source in (file_queue, watch_queue):
+                        while len(batch) < BATCH_SIZE:
+                            try:
+                                batch.append(source.get_nowait())
+                            except queue.Empty:
+                                break
+                    
+                    # Capture hands over (filepath, frame); the watcher only has a path
+                    pending = {}
+                    for item in batch:
+                        filepath, frame = item if isinstance(item, tuple) else (item, None)
+                        if pending.get(filepath) is None:
+                            pending[filepath] = frame
+                    
+                    with self.processed_lock:
+                        pending = {p: f for p, f in pending.items() if p not in self.processed_files}
+                    
+                    # Only files that didn't come with a frame are read from disk
+                    paths, images = [], []
+                    for filepath, frame in pending.items():
+                        if frame is None and os.path.isfile(filepath):
+                            frame = cv2.imread(filepath)
+                        if frame is not None:
+                            paths.append(filepath)
+                            # Saved file keeps full resolution; only the detection copy shrinks
+                            images.append(downscale_for_detection(frame))
+                    
+                    if images:
+                        # One YOLO call for the whole batch, then report per image
+                        for filepath, road_data in zip(paths, self.detect_vehicles_batch(images)):
+                            self.process_image(filepath, road_data)
+                            self._mark_processed(filepath)
                 
-                time.sleep(2)
-            
-            except KeyboardInterrupt:
-                break
-            except Exception as e:
-                print(f"[DETECTION] ✗ Error: {e}")
-                time.sleep(2)
+                except KeyboardInterrupt:
+                    break
+                except Exception as e:
+                    print(f"[DETECTION] ✗ Error: {e}")
+                    time.sleep(2)
+        finally:
+            observer.stop()
+            observer.join()
     
     def run(self):
         """Start the complete pipeline."""
@@ -244,28 +380,32 @@ class SmartTrafficSystem:
         print("[START] Launching parallel capture and detection threads...")
         print("[INFO] Press Ctrl+C to stop\n")
         
-        # Start capture thread
-        capture_thread = threading.Thread(target=self.capture_loop, daemon=True)
-        capture_thread.start()
-        
-        # Start detection thread
-        detection_thread = threading.Thread(target=self.detection_loop, daemon=True)
-        detection_thread.start()
+        # Bounded hand-off between capture and detection
+        file_queue = queue.Queue(maxsize=BATCH_SIZE * 4)
         
-        try:
-            while self.running:
-                time.sleep(1)
-        
-        except KeyboardInterrupt:
-            print("\n\n[STOP] Shutting down system...")
-            self.running = False
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            capture_future = executor.submit(self.capture_loop, file_queue)
+            detect_future = executor.submit(self.detection_loop, file_queue)
             
-            # Cleanup
-            if self.capturer:
-                self.capturer.disconnect()
+            try:
+                while self.running:
+                    time.sleep(1)
             
-            print(f"[INFO] Processed {len(self.processed_files)} images total")
-            print("="*70 + "\n")
+            except KeyboardInterrupt:
+                print("\n\n[STOP] Shutting down system...")
+                self.running = False
+        
+        # Workers have exited (executor waited for them)
+        for future in (capture_future, detect_future):
+            if future.exception():
+                print(f"[ERROR] Worker stopped with: {future.exception()}")
+        
+        # Cleanup
+        if self.capturer:
+            self.capturer.disconnect()
+        
+        print(f"[INFO] Processed {self.processed_count} images total")
+        print("="*70 + "\n")
 
 
 def main():
@@ -4,6 +4,8 @@ Sends traffic density data to ThingSpeak IoT platform
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import sys
 from datetime import datetime
@@ -13,6 +15,9 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 from config import THINGSPEAK_BASE_URL, THINGSPEAK_API_KEY, VERBOSE
 
+# Numeric density status sent in field7
+DENSITY_LEVELS = {"LOW": 1, "MEDIUM": 2, "HIGH": 3}
+
 
 class ThingSpeakClient:
     """Client to send data to ThingSpeak."""
@@ -21,6 +26,13 @@ class ThingSpeakClient:
         self.api_key = api_key
         self.base_url = THINGSPEAK_BASE_URL
         self.last_update = None
+        
+        # Pooled keep-alive session; retries cover dropped connections
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(
+            pool_connections=2, pool_maxsize=2,
+            max_retries=Retry(total=2, backoff_factor=0.2)
+        ))
     
     def send_traffic_data(self, road_data):
         """
@@ -35,6 +47,15 @@ class ThingSpeakClient:
                 }
         """
         try:
+            # Totals, overall density level and ambulance presence in one pass
+            total_cars = 0
+            total_ambulances = 0
+            density_level = 1
+            for rd in road_data.values():
+                total_cars += rd["cars"]
+                total_ambulances += rd["ambulances"]
+                density_level = max(density_level, DENSITY_LEVELS.get(rd["density"], 1))
+            
             # Prepare payload for ThingSpeak
             payload = {
                 "api_key": self.api_key,
@@ -42,14 +63,14 @@ class ThingSpeakClient:
                 "field2": road_data[1]["total"],  # Road 2 total
                 "field3": road_data[2]["total"],  # Road 3 total
                 "field4": road_data[3]["total"],  # Road 4 total
-                "field5": sum(rd["cars"] for rd in road_data.values()),  # Total cars
-                "field6": sum(rd["ambulances"] for rd in road_data.values()),  # Total ambulances
-                "field7": self._encode_density(road_data),  # Encoded density status
-                "field8": self._get_priority_alert(road_data),  # Priority alert
+                "field5": total_cars,  # Total cars
+                "field6": total_ambulances,  # Total ambulances
+                "field7": density_level,  # Encoded density status (1 Low, 2 Medium, 3 High)
+                "field8": 1 if total_ambulances > 0 else 0,  # Priority alert (ambulance detected)
             }
             
             # Send to ThingSpeak
-            response = requests.post(self.base_url, params=payload, timeout=5)
+            response = self._session.post(self.base_url, params=payload, timeout=5)
             
             if response.status_code == 200:
                 if VERBOSE:
@@ -68,27 +89,11 @@ class ThingSpeakClient:
             print(f"[THINGSPEAK] ✗ Error: {e}")
             return False
     
-    def _encode_density(self, road_data):
-        """Encode overall density as numeric value for ThingSpeak."""
-        densities = [rd["density"] for rd in road_data.values()]
-        
-        if "HIGH" in densities:
-            return 3  # High
-        elif "MEDIUM" in densities:
-            return 2  # Medium
-        else:
-            return 1  # Low
-    
-    def _get_priority_alert(self, road_data):
-        """Check if ambulance detected and return priority flag."""
-        ambulance_count = sum(rd["ambulances"] for rd in road_data.values())
-        return 1 if ambulance_count > 0 else 0
-    
     def verify_connection(self):
         """Test ThingSpeak connection."""
         try:
             payload = {"api_key": self.api_key, "field1": 0}
-            response = requests.post(self.base_url, params=payload, timeout=5)
+            response = self._session.post(self.base_url, params=payload, timeout=5)
             
             if response.status_code == 200:
                 print("[THINGSPEAK] ✓ Connection verified")
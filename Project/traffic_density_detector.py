@@ -5,18 +5,23 @@ Uses OpenCV-based image processing for vehicle detection.
 """
 
 import os
+import sys
+import queue
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import cv2
 import numpy as np
 from datetime import datetime
 from pathlib import Path
-import time
+
+sys.path.insert(0, str(Path(__file__).parent))
+from capture_watcher import start_watcher
 
 # Configuration
 CAPTURES_FOLDER = "captures"
-PROCESSED_FILES = set()
 MIN_CONTOUR_AREA = 200  # Minimum area to consider as a vehicle
 MAX_CONTOUR_AREA = 50000  # Maximum area to filter noise
-POLLING_INTERVAL = 2  # seconds between folder checks
+MIN_ASPECT_RATIO = 0.3  # Width/height range of a vehicle (not too tall or too wide)
+MAX_ASPECT_RATIO = 3.0
 
 
 class TrafficDensityDetector:
@@ -26,12 +31,20 @@ class TrafficDensityDetector:
         self.processed_files = set()
         self.create_captures_folder()
     
+    @staticmethod
+    def warmup():
+        """Run the OpenCV pipeline once on a blank frame so the first image isn't slower (pool initializer)."""
+        blank = np.zeros((480, 640), dtype=np.uint8)
+        edges = cv2.Canny(cv2.GaussianBlur(blank, (5, 5), 0), 50, 150)
+        cv2.connectedComponentsWithStats(edges, connectivity=8)
+    
     def create_captures_folder(self):
         """Ensure captures folder exists."""
         Path(CAPTURES_FOLDER).mkdir(exist_ok=True)
         print(f"[INIT] Monitoring folder: {os.path.abspath(CAPTURES_FOLDER)}")
     
-    def detect_vehicles(self, image_path):
+    @staticmethod
+    def detect_vehicles(image_path):
         """
         Detect vehicles in an image using edge detection and contour analysis.
         Returns: vehicle_count (int)
@@ -56,30 +69,27 @@ class TrafficDensityDetector:
             kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
             dilated = cv2.dilate(edges, kernel, iterations=2)
             
-            # Find contours
-            contours, _ = cv2.findContours(dilated, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+            # Label connected edge regions; area and bounding box come back as one stats array
+            num, labels, stats, _ = cv2.connectedComponentsWithStats(dilated, connectivity=8)
             
-            # Filter contours by area (potential vehicles)
-            vehicle_contours = []
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if MIN_CONTOUR_AREA < area < MAX_CONTOUR_AREA:
-                    # Additional filter: aspect ratio (vehicles are not too square)
-                    x, y, w, h = cv2.boundingRect(contour)
-                    if w > 0 and h > 0:
-                        aspect_ratio = float(w) / h
-                        # Accept contours with reasonable aspect ratios
-                        if 0.3 < aspect_ratio < 3.0:
-                            vehicle_contours.append(contour)
+            # Filter regions by area (potential vehicles) and aspect ratio (vehicles are not too square)
+            # Row 0 is the background
+            areas = stats[1:, cv2.CC_STAT_AREA]
+            aspect_ratio = stats[1:, cv2.CC_STAT_WIDTH] / np.maximum(stats[1:, cv2.CC_STAT_HEIGHT], 1)
+            mask = (
+                (MIN_CONTOUR_AREA < areas) & (areas < MAX_CONTOUR_AREA)
+                & (aspect_ratio > MIN_ASPECT_RATIO) & (aspect_ratio < MAX_ASPECT_RATIO)
+            )
             
-            vehicle_count = len(vehicle_contours)
+            vehicle_count = int(mask.sum())
             return vehicle_count
         
         except Exception as e:
             print(f"[ERROR] Exception in vehicle detection: {e}")
             return 0
     
-    def classify_density(self, vehicle_count):
+    @staticmethod
+    def classify_density(vehicle_count):
         """
         Classify traffic density based on vehicle count.
         Returns: density_category (str)
@@ -91,24 +101,21 @@ class TrafficDensityDetector:
         else:
             return "HIGH"
     
-    def process_image(self, image_path):
+    @staticmethod
+    def process_image(image_path):
         """
         Process a single image: detect vehicles and classify density.
+        Static so it pickles cleanly into worker processes; printing is left to the parent
+        (see print_result) so output from several workers doesn't interleave.
         """
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         filename = os.path.basename(image_path)
         
-        print(f"\n[{timestamp}] Processing: {filename}")
-        
         # Detect vehicles
-        vehicle_count = self.detect_vehicles(image_path)
+        vehicle_count = TrafficDensityDetector.detect_vehicles(image_path)
         
         # Classify density
-        density = self.classify_density(vehicle_count)
-        
-        # Output results
-        print(f"  ├─ Vehicles Detected: {vehicle_count}")
-        print(f"  └─ Traffic Density: {density}")
+        density = TrafficDensityDetector.classify_density(vehicle_count)
         
         return {
             "filename": filename,
@@ -117,23 +124,12 @@ class TrafficDensityDetector:
             "timestamp": timestamp
         }
     
-    def get_new_images(self):
-        """
-        Get list of unprocessed images in captures folder.
-        Returns: list of image paths
-        """
-        if not os.path.exists(CAPTURES_FOLDER):
-            return []
-        
-        image_files = []
-        for filename in os.listdir(CAPTURES_FOLDER):
-            # Check if it's an image file
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-                filepath = os.path.join(CAPTURES_FOLDER, filename)
-                if filepath not in self.processed_files and os.path.isfile(filepath):
-                    image_files.append(filepath)
-        
-        return sorted(image_files)
+    @staticmethod
+    def print_result(result):
+        """Print the summary of one processed image."""
+        print(f"\n[{result['timestamp']}] Processing: {result['filename']}")
+        print(f"  ├─ Vehicles Detected: {result['vehicle_count']}")
+        print(f"  └─ Traffic Density: {result['density']}")
     
     def run(self):
         """
@@ -143,29 +139,56 @@ class TrafficDensityDetector:
         print("SMART TRAFFIC MANAGEMENT SYSTEM - ML PIPELINE")
         print("="*60)
         print("[START] Monitoring for new images...")
-        print(f"[INFO] Check interval: {POLLING_INTERVAL} seconds")
+        print("[INFO] Watching folder events (no polling)")
         print("="*60 + "\n")
         
+        # Existing images are queued first, then new ones as they are written
+        file_queue = queue.Queue()
+        observer = start_watcher(CAPTURES_FOLDER, file_queue)
+        # Each worker warms up its own OpenCV pipeline once
+        pool = ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=TrafficDensityDetector.warmup)
+        
         try:
             while True:
-                # Get new images
-                new_images = self.get_new_images()
+                try:
+                    new_images = [file_queue.get(timeout=1.0)]
+                except queue.Empty:
+                    continue
+                
+                # Take everything else that is already waiting so the pool gets a full burst
+                while True:
+                    try:
+                        new_images.append(file_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                
+                new_images = [
+                    p for p in dict.fromkeys(new_images)
+                    if p not in self.processed_files and os.path.isfile(p)
+                ]
+                if not new_images:
+                    continue
                 
-                if new_images:
-                    for image_path in new_images:
-                        # Process image
-                        result = self.process_image(image_path)
-                        
-                        # Mark as processed
-                        self.processed_files.add(image_path)
+                # Process images across CPU cores
+                futures = {pool.submit(self.process_image, p): p for p in new_images}
                 
-                # Wait before checking again
-                time.sleep(POLLING_INTERVAL)
+                # Mark as processed as each one finishes
+                for future in as_completed(futures):
+                    image_path = futures[future]
+                    try:
+                        self.print_result(future.result())
+                    except Exception as e:
+                        print(f"[ERROR] Failed to process {image_path}: {e}")
+                    self.processed_files.add(image_path)
         
         except KeyboardInterrupt:
             print("\n\n[STOP] Pipeline interrupted by user.")
             print(f"[INFO] Processed {len(self.processed_files)} images in total.")
             print("="*60 + "\n")
+        finally:
+            observer.stop()
+            observer.join()
+            pool.shutdown(cancel_futures=True)
 
 
 def main():
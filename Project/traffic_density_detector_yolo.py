@@ -5,21 +5,60 @@ Categorizes traffic density per road.
 """
 
 import os
+import sys
+import json
+import queue
+import logging
+import argparse
+from collections import OrderedDict
 import cv2
 import numpy as np
+import torch
+import torch.nn.functional as F
+from torchvision.io import read_file, decode_jpeg, ImageReadMode
 from datetime import datetime
 from pathlib import Path
-import time
-from ultralytics import YOLO
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:  # numba is optional; fall back to NumPy
+    HAS_NUMBA = False
+
+sys.path.insert(0, str(Path(__file__).parent))
+from model_registry import get_yolo, cached_engine, compile_yolo
+from capture_watcher import start_watcher, content_hash
+
+# Let FP32 matmuls use TF32 Tensor Cores and let cuDNN autotune conv kernels
+torch.set_float32_matmul_precision('high')
+torch.backends.cudnn.benchmark = True
+
+log = logging.getLogger("traffic")
 
 # Configuration
 CAPTURES_FOLDER = "captures"
+DONE_FOLDER = os.path.join(CAPTURES_FOLDER, "done")  # Processed images are moved here
 MODEL_PATH = "Project/custom_model.pt"  # Your trained YOLO model
-POLLING_INTERVAL = 2  # seconds between folder checks
+
+# Most recent image content hashes remembered for duplicate suppression
+MAX_SEEN_HASHES = 10000
+
+# Largest batch the TensorRT engine is built for
+ENGINE_BATCH = 8
+
+# Input size for batches decoded on the GPU (tensors are not letterboxed by Ultralytics,
+# so this is done here with the same gray padding value)
+GPU_INPUT_SIZE = 640
+LETTERBOX_FILL = 114 / 255.0
 
 # Road/Lane division (4 vertical lanes)
 NUM_ROADS = 4
 
+# Per-road density: < 3 vehicles LOW, < 8 MEDIUM, else HIGH
+# (thresholds tuned for per-road detection; used by aggregate())
+DENSITY_BOUNDS = np.array([3, 8])
+DENSITY_LABELS = ("LOW", "MEDIUM", "HIGH")
+
 # Class names for detection
 CLASS_NAMES = {
     0: "car",
@@ -27,17 +66,73 @@ CLASS_NAMES = {
 }
 
 
+if HAS_NUMBA:
+    @njit(cache=True)
+    def aggregate(cars, ambulances, totals):
+        """
+        Density level (0=LOW, 1=MEDIUM, 2=HIGH) per road plus car/ambulance totals.
+        Returns: (densities, total_cars, total_ambulances)
+        """
+        densities = np.empty(totals.size, np.int8)
+        for i in range(totals.size):
+            t = totals[i]
+            densities[i] = 0 if t < DENSITY_BOUNDS[0] else (1 if t < DENSITY_BOUNDS[1] else 2)
+        return densities, cars.sum(), ambulances.sum()
+else:
+    def aggregate(cars, ambulances, totals):
+        """
+        Density level (0=LOW, 1=MEDIUM, 2=HIGH) per road plus car/ambulance totals.
+        Returns: (densities, total_cars, total_ambulances)
+        """
+        densities = np.searchsorted(DENSITY_BOUNDS, totals, side='right').astype(np.int8)
+        return densities, cars.sum(), ambulances.sum()
+
+
+def letterbox_gpu(image, out, size=GPU_INPUT_SIZE):
+    """
+    Resize a (3, H, W) uint8 tensor to fit size x size keeping the aspect ratio and write it,
+    centered and scaled to [0, 1], into `out` (a (3, size, size) tensor pre-filled with padding).
+    Returns: (scale, pad_x) to map box x coordinates back to the source image
+    """
+    height, width = image.shape[-2:]
+    scale = size / max(height, width)
+    new_h, new_w = round(height * scale), round(width * scale)
+    top, left = (size - new_h) // 2, (size - new_w) // 2
+    resized = F.interpolate(image[None].float(), size=(new_h, new_w), mode='bilinear', align_corners=False)[0]
+    out[:, top:top + new_h, left:left + new_w] = resized.div_(255.0)
+    return scale, left
+
+
+def read_image_gpu(image_path, device):
+    """
+    Read an image straight into a CUDA tensor (3, H, W) uint8 RGB.
+    JPEGs are decoded on the GPU with nvJPEG; other formats fall back to cv2.imread.
+    Returns: tensor, or None if the image could not be read
+    """
+    if image_path.lower().endswith(('.jpg', '.jpeg')):
+        return decode_jpeg(read_file(image_path), mode=ImageReadMode.RGB, device=device)
+    
+    image = cv2.imread(image_path)
+    if image is None:
+        return None
+    return torch.from_numpy(image[..., ::-1].copy()).permute(2, 0, 1).to(device)
+
+
 class MultiRoadTrafficDetector:
     """Detects vehicles across 4 roads and classifies traffic density."""
     
-    def __init__(self, model_path=MODEL_PATH):
-        self.processed_files = set()
+    def __init__(self, model_path=MODEL_PATH, verbose=False):
+        self.verbose = verbose  # Per-road breakdown for humans instead of one log line per image
+        self.processed_count = 0
+        self.seen_hashes = OrderedDict()  # content hash -> None, oldest first
+        self._region_cache = {}  # (height, width) -> (lane_width, regions)
         self.create_captures_folder()
         self.load_model(model_path)
     
     def create_captures_folder(self):
         """Ensure captures folder exists."""
         Path(CAPTURES_FOLDER).mkdir(exist_ok=True)
+        Path(DONE_FOLDER).mkdir(exist_ok=True)
         print(f"[INIT] Monitoring folder: {os.path.abspath(CAPTURES_FOLDER)}")
     
     def load_model(self, model_path):
@@ -45,11 +140,33 @@ class MultiRoadTrafficDetector:
         if not os.path.exists(model_path):
             print(f"[ERROR] Model not found at {model_path}")
             print(f"[INFO] Using default yolov8m.pt instead")
-            self.model = YOLO("yolov8m.pt")
+            model_path = "yolov8m.pt"
         else:
             print(f"[LOAD] Loading custom model: {model_path}")
-            self.model = YOLO(model_path)
-            print(f"[SUCCESS] Model loaded successfully")
+        
+        # On CUDA, export a TensorRT engine once and load that instead of the .pt
+        self.half = torch.cuda.is_available()
+        self.device = 0 if self.half else 'cpu'
+        if self.half:
+            try:
+                model_path = cached_engine(model_path, batch=ENGINE_BATCH)
+                print(f"[LOAD] Using TensorRT engine: {model_path}")
+            except Exception as e:
+                print(f"[WARN] TensorRT export failed, using PyTorch weights: {e}")
+        
+        self.model = get_yolo(model_path, task='detect')
+        
+        if self.half:
+            # Warm up on the fixed GPU input shape; PyTorch weights are then compiled with
+            # CUDA graphs (no-op for the TensorRT engine) and the graphs captured
+            dummy = torch.zeros((1, 3, GPU_INPUT_SIZE, GPU_INPUT_SIZE), device=f"cuda:{self.device}")
+            with torch.inference_mode():
+                self.model(dummy, verbose=False, half=self.half, device=self.device)
+                if compile_yolo(self.model):
+                    for _ in range(3):
+                        self.model(dummy, verbose=False, half=self.half, device=self.device)
+                    print(f"[LOAD] Model compiled with torch.compile (CUDA graphs)")
+        print(f"[SUCCESS] Model loaded successfully")
     
     def get_road_region(self, image_height, image_width, road_id):
         """
@@ -67,112 +184,177 @@ class MultiRoadTrafficDetector:
         
         return (y_min, y_max, x_min, x_max)
     
+    def _road_layout(self, image_height, image_width):
+        """
+        Lane width and all road regions for one resolution, computed once and cached
+        (frames from the same camera share a resolution).
+        Returns: (lane_width, regions)
+        """
+        key = (image_height, image_width)
+        layout = self._region_cache.get(key)
+        if layout is None:
+            regions = tuple(self.get_road_region(image_height, image_width, road_id) for road_id in range(NUM_ROADS))
+            layout = (image_width // NUM_ROADS, regions)
+            self._region_cache[key] = layout
+        return layout
+    
     def detect_vehicles(self, image_path):
         """
         Detect cars and ambulances using YOLO.
         Returns: detections for each road
         """
+        return self.detect_vehicles_batch([image_path])[0]
+    
+    def detect_vehicles_batch(self, image_paths):
+        """
+        Detect cars and ambulances in several images with a single YOLO forward pass.
+        Returns: list of per-road detections (None where detection failed), in input order
+        """
+        road_data_list = [None] * len(image_paths)
         try:
-            # Read image
-            image = cv2.imread(image_path)
-            if image is None:
-                print(f"[ERROR] Failed to read image: {image_path}")
-                return None
-            
-            image_height, image_width = image.shape[:2]
+            # Read images (decoded on the GPU when CUDA is available)
+            images, shapes, indices = [], [], []
+            for i, image_path in enumerate(image_paths):
+                if self.half:
+                    image = read_image_gpu(image_path, f"cuda:{self.device}")
+                else:
+                    image = cv2.imread(image_path)
+                if image is None:
+                    log.error("Failed to read image: %s", image_path)
+                    continue
+                images.append(image)
+                shapes.append(image.shape[-2:] if self.half else image.shape[:2])
+                indices.append(i)
             
-            # Run YOLO inference
-            results = self.model(image, verbose=False)
+            if not images:
+                return road_data_list
             
-            # Initialize road data
-            road_data = {}
-            for road_id in range(NUM_ROADS):
-                road_data[road_id] = {
-                    "cars": 0,
-                    "ambulances": 0,
-                    "total": 0,
-                    "region": self.get_road_region(image_height, image_width, road_id)
-                }
+            # Per image (scale, pad_x) from model-input to source x coordinates
+            transforms = [(1.0, 0)] * len(images)
             
-            # Process detections
-            if results and len(results) > 0:
-                result = results[0]
+            with torch.inference_mode():
+                if self.half:
+                    # Letterbox on the GPU and hand Ultralytics a ready (N, 3, 640, 640) RGB batch in [0, 1]
+                    batch = torch.full((len(images), 3, GPU_INPUT_SIZE, GPU_INPUT_SIZE), LETTERBOX_FILL,
+                                       device=f"cuda:{self.device}")
+                    transforms = [letterbox_gpu(image, batch[k]) for k, image in enumerate(images)]
+                    images = batch
                 
-                if result.boxes is not None:
-                    boxes = result.boxes.xyxy.cpu().numpy()  # Bounding boxes
-                    classes = result.boxes.cls.cpu().numpy().astype(int)  # Class IDs
-                    confidences = result.boxes.conf.cpu().numpy()  # Confidence scores
-                    
-                    # Process each detection
-                    for box, cls_id, conf in zip(boxes, classes, confidences):
-                        x_min, y_min, x_max, y_max = box
-                        center_x = (x_min + x_max) / 2
-                        
-                        # Determine which road this detection belongs to
-                        road_id = int(center_x // (image_width // NUM_ROADS))
-                        road_id = min(road_id, NUM_ROADS - 1)
-                        
-                        # Count by type
-                        if cls_id == 0:  # Car
-                            road_data[road_id]["cars"] += 1
-                        elif cls_id == 1:  # Ambulance
-                            road_data[road_id]["ambulances"] += 1
-                        
-                        road_data[road_id]["total"] += 1
-            
-            return road_data
+                # Run YOLO inference (Ultralytics letterboxes numpy images to 640 internally)
+                # stream=True yields results one at a time, so each is tallied while the rest are postprocessed
+                results = self.model(images, stream=True, verbose=False, half=self.half, device=self.device)
+                
+                for i, shape, transform, result in zip(indices, shapes, transforms, results):
+                    road_data_list[i] = self._tally_result(result, shape, *transform)
         
         except Exception as e:
-            print(f"[ERROR] Exception in vehicle detection: {e}")
-            return None
+            log.error("Exception in vehicle detection: %s", e)
+        
+        return road_data_list
     
-    def classify_density(self, vehicle_count):
+    def _tally_result(self, result, image_shape, scale=1.0, pad_x=0):
         """
-        Classify traffic density based on vehicle count.
-        Adjusted thresholds for per-road detection.
+        Count cars / ambulances per road in one Ultralytics result.
+        image_shape is the source (height, width); scale/pad_x undo a GPU letterbox.
         """
-        if vehicle_count < 3:
-            return "LOW"
-        elif vehicle_count < 8:
-            return "MEDIUM"
-        else:
-            return "HIGH"
+        lane_width, regions = self._road_layout(*image_shape)
+        
+        # Columns: car (class 0), ambulance (class 1), any other class
+        counts = np.zeros((NUM_ROADS, 3), dtype=np.int32)
+        
+        # Process detections
+        # Bucketing stays on the inference device; only the NUM_ROADS x 3 counts are copied back
+        if result.boxes is not None and len(result.boxes):
+            boxes = result.boxes.xyxy  # Bounding boxes
+            classes = result.boxes.cls.long().clamp_(0, 2)  # Class IDs -> count column
+            
+            # Determine which road each detection belongs to (by box center, in source pixels)
+            centers = ((boxes[:, 0] + boxes[:, 2]) * 0.5 - pad_x) / scale
+            road_ids = torch.div(centers, lane_width, rounding_mode='floor').long().clamp_(0, NUM_ROADS - 1)
+            
+            # Count by type
+            device_counts = torch.zeros((NUM_ROADS, 3), dtype=torch.int32, device=boxes.device)
+            device_counts.index_put_((road_ids, classes), torch.ones_like(road_ids, dtype=torch.int32), accumulate=True)
+            counts = device_counts.cpu().numpy()
+        
+        car_counts = counts[:, 0]
+        ambulance_counts = counts[:, 1]
+        total_counts = counts.sum(axis=1)
+        
+        # Build road data
+        road_data = {}
+        for road_id in range(NUM_ROADS):
+            road_data[road_id] = {
+                "cars": int(car_counts[road_id]),
+                "ambulances": int(ambulance_counts[road_id]),
+                "total": int(total_counts[road_id]),
+                "region": regions[road_id]
+            }
+        
+        return road_data
     
     def get_road_name(self, road_id):
         """Return friendly name for road/lane."""
         names = ["Road 1 (Lane 1)", "Road 2 (Lane 2)", "Road 3 (Lane 3)", "Road 4 (Lane 4)"]
         return names[road_id]
     
-    def process_image(self, image_path):
+    def process_image(self, image_path, road_data=None):
         """
         Process a single image: detect vehicles per road and classify density.
+        Pass road_data when detection already ran as part of a batch.
+        Logs one JSON summary line per image (the full breakdown with verbose=True).
         """
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         filename = os.path.basename(image_path)
         
-        print(f"\n[{timestamp}] Processing: {filename}")
-        print("=" * 70)
-        
         # Detect vehicles across all roads
-        road_data = self.detect_vehicles(image_path)
+        if road_data is None:
+            road_data = self.detect_vehicles(image_path)
         
         if road_data is None:
-            print("  [SKIP] Detection failed")
+            log.warning("Detection failed, skipped: %s", filename)
             return None
         
-        # Display results per road
-        total_cars = 0
-        total_ambulances = 0
+        # Per-road density levels and totals in one pass over the count arrays
+        cars = np.array([road_data[road_id]["cars"] for road_id in range(NUM_ROADS)], dtype=np.int32)
+        ambulances = np.array([road_data[road_id]["ambulances"] for road_id in range(NUM_ROADS)], dtype=np.int32)
+        totals = np.array([road_data[road_id]["total"] for road_id in range(NUM_ROADS)], dtype=np.int32)
+        densities, total_cars, total_ambulances = aggregate(cars, ambulances, totals)
+        total_cars, total_ambulances = int(total_cars), int(total_ambulances)
         
+        if self.verbose:
+            self.print_summary(timestamp, filename, road_data, densities, total_cars, total_ambulances)
+        else:
+            log.info(json.dumps({
+                "file": filename,
+                "cars": cars.tolist(),
+                "ambulances": ambulances.tolist(),
+                "total": totals.tolist(),
+                "density": [DENSITY_LABELS[d] for d in densities],
+                "total_vehicles": total_cars + total_ambulances,
+            }))
+        
+        return {
+            "filename": filename,
+            "timestamp": timestamp,
+            "road_data": road_data,
+            "total_cars": total_cars,
+            "total_ambulances": total_ambulances,
+            "total_vehicles": total_cars + total_ambulances
+        }
+    
+    def print_summary(self, timestamp, filename, road_data, densities, total_cars, total_ambulances):
+        """Human-readable per-road breakdown of one image (--verbose)."""
+        print(f"\n[{timestamp}] Processing: {filename}")
+        print("=" * 70)
+        
+        # Display results per road
         for road_id in range(NUM_ROADS):
             data = road_data[road_id]
             cars = data["cars"]
             ambulances = data["ambulances"]
             total = data["total"]
-            density = self.classify_density(total)
-            
-            total_cars += cars
-            total_ambulances += ambulances
+            density = DENSITY_LABELS[densities[road_id]]
             
             road_name = self.get_road_name(road_id)
             print(f"  {road_name}:")
@@ -188,33 +370,37 @@ class MultiRoadTrafficDetector:
         print(f"    ├─ Total Ambulances: {total_ambulances}")
         print(f"    └─ Total Vehicles: {total_cars + total_ambulances}")
         print("=" * 70)
-        
-        return {
-            "filename": filename,
-            "timestamp": timestamp,
-            "road_data": road_data,
-            "total_cars": total_cars,
-            "total_ambulances": total_ambulances,
-            "total_vehicles": total_cars + total_ambulances
-        }
     
-    def get_new_images(self):
+    def drop_duplicates(self, image_paths):
         """
-        Get list of unprocessed images in captures folder.
-        Returns: list of image paths
+        Skip images whose content was already seen (e.g. the same frame saved under a new name).
+        Duplicates are moved straight to the done folder.
+        Returns: the image paths that still need processing
         """
-        if not os.path.exists(CAPTURES_FOLDER):
-            return []
-        
-        image_files = []
-        for filename in os.listdir(CAPTURES_FOLDER):
-            # Check if it's an image file
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-                filepath = os.path.join(CAPTURES_FOLDER, filename)
-                if filepath not in self.processed_files and os.path.isfile(filepath):
-                    image_files.append(filepath)
-        
-        return sorted(image_files)
+        unique = []
+        for image_path in image_paths:
+            digest = content_hash(image_path)
+            if digest is not None and digest in self.seen_hashes:
+                log.info("Duplicate image skipped: %s", os.path.basename(image_path))
+                try:
+                    os.replace(image_path, os.path.join(DONE_FOLDER, os.path.basename(image_path)))
+                except OSError:
+                    pass
+                continue
+            if digest is not None:
+                self.seen_hashes[digest] = None
+                if len(self.seen_hashes) > MAX_SEEN_HASHES:
+                    self.seen_hashes.popitem(last=False)
+            unique.append(image_path)
+        return unique
+    
+    def mark_processed(self, image_path):
+        """Move a processed image to the done folder (the folder is the processed ledger)."""
+        try:
+            os.replace(image_path, os.path.join(DONE_FOLDER, os.path.basename(image_path)))
+            self.processed_count += 1
+        except OSError as e:
+            log.error("Failed to move %s to %s: %s", image_path, DONE_FOLDER, e)
     
     def run(self):
         """
@@ -224,36 +410,66 @@ class MultiRoadTrafficDetector:
         print("SMART TRAFFIC MANAGEMENT SYSTEM - MULTI-ROAD ML PIPELINE")
         print("="*70)
         print("[START] Monitoring for new images...")
-        print(f"[INFO] Check interval: {POLLING_INTERVAL} seconds")
+        print("[INFO] Watching folder events (no polling)")
         print(f"[INFO] Detection mode: YOLO (Cars + Ambulances)")
         print(f"[INFO] Roads: {NUM_ROADS} lanes")
         print("="*70 + "\n")
         
+        # Existing images are queued first, then new ones as they are written
+        file_queue = queue.Queue()
+        observer = start_watcher(CAPTURES_FOLDER, file_queue)
+        
         try:
             while True:
-                # Get new images
-                new_images = self.get_new_images()
+                # Block until an image arrives, then take everything else already waiting
+                try:
+                    new_images = [file_queue.get(timeout=1.0)]
+                except queue.Empty:
+                    continue
+                while True:
+                    try:
+                        new_images.append(file_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                
+                # Files still in the captures folder are the unprocessed ones
+                new_images = [
+                    p for p in dict.fromkeys(new_images)
+                    if os.path.dirname(p) == CAPTURES_FOLDER and os.path.isfile(p)
+                ]
+                new_images = self.drop_duplicates(new_images)
                 
                 if new_images:
-                    for image_path in new_images:
-                        # Process image
-                        result = self.process_image(image_path)
+                    # One forward pass per group of images (e.g. the 4 roads of one tick)
+                    batch = min(ENGINE_BATCH, len(new_images))
+                    for group in [new_images[i:i + batch] for i in range(0, len(new_images), batch)]:
+                        road_data_list = self.detect_vehicles_batch(group)
                         
-                        # Mark as processed
-                        self.processed_files.add(image_path)
-                
-                # Wait before checking again
-                time.sleep(POLLING_INTERVAL)
+                        for image_path, road_data in zip(group, road_data_list):
+                            # Process image
+                            result = self.process_image(image_path, road_data)
+                            
+                            # Mark as processed by moving it out of the captures folder
+                            if result is not None:
+                                self.mark_processed(image_path)
         
         except KeyboardInterrupt:
             print("\n\n[STOP] Pipeline interrupted by user.")
-            print(f"[INFO] Processed {len(self.processed_files)} images in total.")
+            print(f"[INFO] Processed {self.processed_count} images in total.")
             print("="*70 + "\n")
+        finally:
+            observer.stop()
+            observer.join()
 
 
 def main():
     """Entry point for the multi-road traffic density detection pipeline."""
-    detector = MultiRoadTrafficDetector()
+    parser = argparse.ArgumentParser(description="Multi-road YOLO traffic density pipeline")
+    parser.add_argument("--verbose", action="store_true", help="print the per-road breakdown of every image")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    detector = MultiRoadTrafficDetector(verbose=args.verbose)
     detector.run()
 
 
@@ -1,14 +1,33 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
+import torch
+from pathlib import Path
+from model_registry import get_yolo, cached_engine
+
+# Let FP32 matmuls use TF32 Tensor Cores and let cuDNN autotune conv kernels
+torch.set_float32_matmul_precision('high')
+torch.backends.cudnn.benchmark = True
+
+# Largest batch the TensorRT engine is built for
+MAX_BATCH = 8
 
 class TrafficAnalyzer:
     def __init__(self, model_path='yolov8m.pt'):
-        self.model = YOLO(model_path)
         # Check if custom model (2 classes: vehicle, ambulance) or default (COCO classes)
         # Custom model: 0=vehicle, 1=ambulance
         # Default model: 2=car, 3=motorcycle, 5=bus, 7=truck
-        self.is_custom_model = model_path.endswith('custom_model.pt')
+        # (checked by stem so exported copies like custom_model.torchscript match too)
+        self.is_custom_model = Path(model_path).stem == 'custom_model'
+        
+        self.half = torch.cuda.is_available()
+        self.device = 0 if self.half else 'cpu'
+        # On CUDA, export a TensorRT engine once and load that instead of the .pt
+        if self.half and model_path.endswith('.pt'):
+            try:
+                model_path = cached_engine(model_path, batch=MAX_BATCH)
+            except Exception as e:
+                print(f"[ANALYZER] TensorRT export failed, using {Path(model_path).name}: {e}")
+        self.model = get_yolo(model_path, task='detect')
         if self.is_custom_model:
             self.vehicle_classes = [0]  # Only regular vehicles for density
             self.ambulance_class = 1    # Ambulance class
@@ -74,12 +93,13 @@ class TrafficAnalyzer:
         added_time = (density_percentage / 100) * (MAX_TIME - MIN_TIME)
         return int(MIN_TIME + added_time)
 
-    def analyze_road_image(self, image_input):
+    def analyze_road_image(self, image_input, annotate=False):
         """
         Analyzes a single image representing ONE road.
         Accepts: image_path (str) OR image (numpy array)
+        annotate: draw the detections (only needed when the image is shown in a UI)
 
-        Returns: (vehicle_count, density_percentage, annotated_image, has_ambulance)
+        Returns: (vehicle_count, density_percentage, annotated_image or None, has_ambulance)
         """
         if isinstance(image_input, str):
             img = cv2.imread(image_input)
@@ -89,16 +109,34 @@ class TrafficAnalyzer:
         if img is None:
             return 0, 0.0, None, False
         
-        # Run inference - detect all classes (vehicles + ambulance if custom model)
-        if self.is_custom_model:
-            # Custom model: detect both vehicles and ambulances
-            results = self.model(img, verbose=False, conf=0.25)
-        else:
-            # Default model: only detect vehicles
-            results = self.model(img, verbose=False, classes=self.vehicle_classes, conf=0.25)
+        return self.analyze_road_images_batch([img], annotate=annotate)[0]
+
+    def analyze_road_images_batch(self, images, annotate=False):
+        """
+        Analyzes several road images (numpy arrays) with a single YOLO forward pass.
+        annotate: draw the detections (only needed when the images are shown in a UI)
+
+        Returns: list of (vehicle_count, density_percentage, annotated_image or None, has_ambulance),
+        in the same order as images
+        """
+        if not images:
+            return []
         
-        result = results[0]
+        # Run inference - detect all classes (vehicles + ambulance if custom model)
+        with torch.inference_mode():
+            if self.is_custom_model:
+                # Custom model: detect both vehicles and ambulances
+                results = self.model(images, verbose=False, conf=0.25,
+                                     half=self.half, device=self.device)
+            else:
+                # Default model: only detect vehicles
+                results = self.model(images, verbose=False, classes=self.vehicle_classes, conf=0.25,
+                                     half=self.half, device=self.device)
         
+        return [self._summarize_result(result, annotate) for result in results]
+
+    def _summarize_result(self, result, annotate=False):
+        """Count vehicles / ambulances in one Ultralytics result."""
         vehicle_count = 0
         ambulance_detected = False
         
@@ -120,8 +158,8 @@ class TrafficAnalyzer:
                 if cls_id in self.vehicle_classes:
                     vehicle_count += 1
         
-        # Generate annotated image
-        annotated_img = result.plot()
+        # Generate annotated image (a full-resolution copy + drawing pass, so opt-in)
+        annotated_img = result.plot() if annotate else None
                 
         density = self.get_density_percentage(vehicle_count)
         return vehicle_count, density, annotated_img, ambulance_detected